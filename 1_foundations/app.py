@@ -2,6 +2,7 @@ from dotenv import load_dotenv
 from openai import OpenAI
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from pypdf import PdfReader
 import gradio as gr
@@ -9,15 +10,27 @@ import gradio as gr
 
 load_dotenv(override=True)
 
+def send_push(text):
+    try:
+        requests.post(
+            "https://api.pushover.net/1/messages.json",
+            data={
+                "token": os.getenv("PUSHOVER_TOKEN"),
+                "user": os.getenv("PUSHOVER_USER"),
+                "message": text,
+            },
+            timeout=10,
+        )
+    except requests.RequestException as e:
+        print(f"Push notification failed: {e}")
+
+# One sender thread, so pushes go out in order and the chat reply doesn't wait for them;
+# its queue is drained before the process exits
+push_sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="push")
+
+
 def push(text):
-    requests.post(
-        "https://api.pushover.net/1/messages.json",
-        data={
-            "token": os.getenv("PUSHOVER_TOKEN"),
-            "user": os.getenv("PUSHOVER_USER"),
-            "message": text,
-        }
-    )
+    push_sender.submit(send_push, text)
 
 
 def record_user_details(email, name="Name not provided", notes="not provided"):
@@ -2,9 +2,26 @@ from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
 import os
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
 
+def send_push(message: str) -> None:
+    pushover_user = os.getenv("PUSHOVER_USER")
+    pushover_token = os.getenv("PUSHOVER_TOKEN")
+    pushover_url = "https://api.pushover.net/1/messages.json"
+
+    payload = {"user": pushover_user, "token": pushover_token, "message": message}
+    try:
+        requests.post(pushover_url, data=payload, timeout=10)
+    except requests.RequestException as e:
+        print(f"Push notification failed: {e}")
+
+
+# Sends in the background, one at a time; Python finishes what's queued before the crew's process exits
+push_sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="push")
+
+
 class PushNotification(BaseModel):
     """A message to be sent to the user"""
     message: str = Field(..., description="The message to be sent to the user.")
@@ -19,11 +36,6 @@ class PushNotificationTool(BaseTool):
     args_schema: Type[BaseModel] = PushNotification
 
     def _run(self, message: str) -> str:
-        pushover_user = os.getenv("PUSHOVER_USER")
-        pushover_token = os.getenv("PUSHOVER_TOKEN")
-        pushover_url = "https://api.pushover.net/1/messages.json"
-
         print(f"Push: {message}")
-        payload = {"user": pushover_user, "token": pushover_token, "message": message}
-        requests.post(pushover_url, data=payload)
+        push_sender.submit(send_push, message)
         return '{"notification": "ok"}'
\ No newline at end of file
@@ -3,6 +3,7 @@ from langchain_community.agent_toolkits import PlayWrightBrowserToolkit
 from dotenv import load_dotenv
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from langchain.agents import Tool
 from langchain_community.agent_toolkits import FileManagementToolkit
 from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
@@ -25,9 +26,19 @@ async def playwright_tools():
     return toolkit.get_tools(), browser, playwright
 
 
+def send_push(text: str):
+    try:
+        requests.post(pushover_url, data = {"token": pushover_token, "user": pushover_user, "message": text}, timeout=10)
+    except requests.RequestException as e:
+        print(f"Push notification failed: {e}")
+
+
+push_sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="push")
+
+
 def push(text: str):
-    """Send a push notification to the user"""
-    requests.post(pushover_url, data = {"token": pushover_token, "user": pushover_user, "message": text})
+    """Send a push notification to the user, without waiting for Pushover"""
+    push_sender.submit(send_push, text)
     return "success"
 
 
@@ -1,142 +1,352 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PrivateAttr, computed_field
+import numpy as np
 import json
+import os
 from dotenv import load_dotenv
 from datetime import datetime
-from market import get_share_price
-from database import write_account, read_account, write_log
+from market import get_share_price, get_share_prices
+from database import (
+    create_account,
+    write_account,
+    write_account_changes,
+    read_account,
+    read_account_transactions,
+    read_portfolio_series,
+    read_transaction_count,
+    write_log,
+    StaleAccountError,
+)
+from ledger import Ledger
+from money import Cents, add_basis_points, to_cents, to_dollars
+from risk import analyze
 
 load_dotenv(override=True)
 
-INITIAL_BALANCE = 10_000.0
-SPREAD = 0.002
+INITIAL_BALANCE_CENTS = 1_000_000
+SPREAD_BASIS_POINTS = 20
+# The compact summary agents are given: how many recent trades it lists, and roughly how many tokens it may use
+SUMMARY_RECENT_TRADES = int(os.getenv("ACCOUNT_SUMMARY_TRADES", "10"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("ACCOUNT_SUMMARY_TOKENS", "1500"))
+CHARS_PER_TOKEN = 4
+# How many times a change is retried against a freshly read account when another writer got there first
+MAX_WRITE_ATTEMPTS = 5
 
 
 class Transaction(BaseModel):
     symbol: str
     quantity: int
-    price: float
+    price_cents: Cents = Field(exclude=True)
     timestamp: str
     rationale: str
 
+    @computed_field
+    @property
+    def price(self) -> float:
+        return to_dollars(self.price_cents)
+
+    def total_cents(self) -> Cents:
+        return self.quantity * self.price_cents
+
     def total(self) -> float:
-        return self.quantity * self.price
-    
+        return to_dollars(self.total_cents())
+
+    def to_record(self) -> dict:
+        """ The transaction with its price in cents, as it is stored. """
+        return {
+            "symbol": self.symbol,
+            "quantity": self.quantity,
+            "price_cents": self.price_cents,
+            "timestamp": self.timestamp,
+            "rationale": self.rationale,
+        }
+
     def __repr__(self):
         return f"{abs(self.quantity)} shares of {self.symbol} at {self.price} each."
 
 
+def _dump_transaction(record: dict) -> dict:
+    """ Transaction.model_dump() of a stored transaction, without validating it into a Transaction. """
+    return {
+        "symbol": record["symbol"],
+        "quantity": record["quantity"],
+        "timestamp": record["timestamp"],
+        "rationale": record["rationale"],
+        "price": to_dollars(record["price_cents"]),
+    }
+
+
 class Account(BaseModel):
     name: str
-    balance: float
+    balance_cents: Cents = Field(exclude=True)
     strategy: str
     holdings: dict[str, int]
     transactions: list[Transaction]
     portfolio_value_time_series: list[tuple[str, float]]
+    ledger: Ledger = Field(default_factory=Ledger)
+
+    # What is already in the database, so that save() only writes the difference
+    _saved_positions: dict[str, tuple[int, Cents]] = PrivateAttr(default_factory=dict)
+    _saved_transactions: int = PrivateAttr(default=0)
+    _saved_points: int = PrivateAttr(default=0)
+    _version: int = PrivateAttr(default=0)
+    _transactions_loaded: bool = PrivateAttr(default=True)
+    _values_loaded: bool = PrivateAttr(default=True)
 
     @classmethod
-    def get(cls, name: str):
-        fields = read_account(name.lower())
+    def get(cls, name: str, history: bool = True):
+        """
+        Load an account, creating it if it doesn't exist yet.
+        With history=False the transactions and portfolio value history, which grow without limit,
+        aren't read until something needs them: the values for risk, the transactions only to list them.
+        """
+        fields = read_account(name.lower(), history)
+        loaded = history
         if not fields:
-            fields = {
+            # Another process may create it at the same moment; whichever account exists afterwards is read back
+            loaded = create_account(name, {
                 "name": name.lower(),
-                "balance": INITIAL_BALANCE,
+                "balance_cents": INITIAL_BALANCE_CENTS,
                 "strategy": "",
                 "holdings": {},
                 "transactions": [],
-                "portfolio_value_time_series": []
-            }
-            write_account(name, fields)
-        return cls(**fields)
-    
-    
+                "portfolio_value_time_series": [],
+                "ledger": Ledger().to_record(),
+            }) or history
+            fields = read_account(name.lower(), history)
+        version = fields.pop("version")
+        account = cls(**fields)
+        account._version = version
+        account._transactions_loaded = loaded
+        account._values_loaded = loaded
+        account._mark_saved()
+        return account
+
+    @computed_field
+    @property
+    def balance(self) -> float:
+        return to_dollars(self.balance_cents)
+
+    @property
+    def version(self) -> int:
+        """ Changes every time the account is saved, by any process. """
+        return self._version
+
+    def to_record(self) -> dict:
+        """ The whole account with amounts in cents, as it is stored. """
+        return {
+            "name": self.name,
+            "balance_cents": self.balance_cents,
+            "strategy": self.strategy,
+            "holdings": dict(self.holdings),
+            "transactions": [transaction.to_record() for transaction in self.transactions],
+            "portfolio_value_time_series": list(self.portfolio_value_time_series),
+            "ledger": self.ledger.to_record(),
+        }
+
+    def _positions(self) -> dict[str, tuple[int, Cents]]:
+        return {symbol: (quantity, self.ledger.position_cost(symbol)) for symbol, quantity in self.holdings.items()}
+
+    def _mark_saved(self):
+        self._saved_positions = self._positions()
+        self._saved_transactions = len(self.transactions)
+        self._saved_points = len(self.portfolio_value_time_series)
+
+    def _ensure_values(self):
+        """
+        Read the portfolio value history of an account loaded without it. Points appended since
+        loading that haven't been saved yet stay on the end.
+        """
+        if self._values_loaded:
+            return
+        points = read_portfolio_series(self.name)
+        self.portfolio_value_time_series = points + self.portfolio_value_time_series[self._saved_points:]
+        self._saved_points = len(points)
+        self._values_loaded = True
+
+    def _dump_transactions(self) -> list[dict]:
+        """
+        Every transaction, as model_dump() gives them. For an account loaded without its history they are
+        read from the database as they are, followed by any appended since that aren't saved yet.
+        """
+        if self._transactions_loaded:
+            return [transaction.model_dump() for transaction in self.transactions]
+        unsaved = [transaction.to_record() for transaction in self.transactions[self._saved_transactions:]]
+        return [_dump_transaction(record) for record in read_account_transactions(self.name) + unsaved]
+
+    def _reload(self):
+        """ Replace this account's state with what is in the database now. """
+        fresh = Account.get(self.name, self._transactions_loaded and self._values_loaded)
+        for field in Account.model_fields:
+            setattr(self, field, getattr(fresh, field))
+        self._version = fresh._version
+        self._transactions_loaded = fresh._transactions_loaded
+        self._values_loaded = fresh._values_loaded
+        self._mark_saved()
+
+    def _with_retry(self, change):
+        """
+        Apply change() to the account and save it. If another writer saved the account first,
+        reload it and apply the change again, so checks like available funds see the latest state.
+        """
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            try:
+                result = change()
+                self.save()
+                return result
+            except StaleAccountError:
+                if attempt == MAX_WRITE_ATTEMPTS - 1:
+                    raise
+                self._reload()
+
     def save(self):
-        write_account(self.name.lower(), self.model_dump())
+        """
+        Write the rows that changed since the account was loaded or last saved.
+        Raises StaleAccountError, writing nothing, if the account was saved elsewhere in the meantime.
+        """
+        positions = self._positions()
+        changed_positions = {
+            symbol: positions.get(symbol, (0, 0))
+            for symbol in positions.keys() | self._saved_positions.keys()
+            if positions.get(symbol) != self._saved_positions.get(symbol)
+        }
+        fields = {
+            "balance_cents": self.balance_cents,
+            "strategy": self.strategy,
+            "realized_pnl_cents": self.ledger.realized_pnl_cents,
+            "net_invested_cents": self.ledger.net_invested_cents,
+        }
+        self._version = write_account_changes(
+            self.name.lower(),
+            fields,
+            changed_positions,
+            [transaction.to_record() for transaction in self.transactions[self._saved_transactions:]],
+            self.portfolio_value_time_series[self._saved_points:],
+            self._version,
+        )
+        self._mark_saved()
 
     def reset(self, strategy: str):
-        self.balance = INITIAL_BALANCE
+        self.balance_cents = INITIAL_BALANCE_CENTS
         self.strategy = strategy
         self.holdings = {}
         self.transactions = []
         self.portfolio_value_time_series = []
-        self.save()
+        self.ledger = Ledger()
+        self._version = write_account(self.name.lower(), self.to_record())
+        self._mark_saved()
 
     def deposit(self, amount: float):
         """ Deposit funds into the account. """
         if amount <= 0:
             raise ValueError("Deposit amount must be positive.")
-        self.balance += amount
+
+        def deposit():
+            self.balance_cents += to_cents(amount)
+
+        self._with_retry(deposit)
         print(f"Deposited ${amount}. New balance: ${self.balance}")
-        self.save()
 
     def withdraw(self, amount: float):
         """ Withdraw funds from the account, ensuring it doesn't go negative. """
-        if amount > self.balance:
-            raise ValueError("Insufficient funds for withdrawal.")
-        self.balance -= amount
+        def withdraw():
+            if to_cents(amount) > self.balance_cents:
+                raise ValueError("Insufficient funds for withdrawal.")
+            self.balance_cents -= to_cents(amount)
+
+        self._with_retry(withdraw)
         print(f"Withdrew ${amount}. New balance: ${self.balance}")
-        self.save()
+
+    def _append(self, transaction: Transaction):
+        """ Append a transaction to the ledger, updating holdings and the running aggregates. """
+        symbol = transaction.symbol
+        held = self.holdings.get(symbol, 0)
+        self.ledger.record(symbol, transaction.quantity, transaction.price_cents, held)
+        self.transactions.append(transaction)
+        if held + transaction.quantity:
+            self.holdings[symbol] = held + transaction.quantity
+        else:
+            del self.holdings[symbol]
 
     def buy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
         """ Buy shares of a stock if sufficient funds are available. """
         price = get_share_price(symbol)
-        buy_price = price * (1 + SPREAD)
-        total_cost = buy_price * quantity
-        
-        if total_cost > self.balance:
-            raise ValueError("Insufficient funds to buy shares.")
-        elif price==0:
-            raise ValueError(f"Unrecognized symbol {symbol}")
-        
-        # Update holdings
-        self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # Record transaction
-        transaction = Transaction(symbol=symbol, quantity=quantity, price=buy_price, timestamp=timestamp, rationale=rationale)
-        self.transactions.append(transaction)
-        
-        # Update balance
-        self.balance -= total_cost
-        self.save()
+        buy_price_cents = add_basis_points(to_cents(price), SPREAD_BASIS_POINTS)
+        total_cost_cents = buy_price_cents * quantity
+
+        def buy():
+            if total_cost_cents > self.balance_cents:
+                raise ValueError("Insufficient funds to buy shares.")
+            elif price==0:
+                raise ValueError(f"Unrecognized symbol {symbol}")
+
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # Record transaction, which also updates holdings
+            transaction = Transaction(symbol=symbol, quantity=quantity, price_cents=buy_price_cents, timestamp=timestamp, rationale=rationale)
+            self._append(transaction)
+
+            # Update balance
+            self.balance_cents -= total_cost_cents
+
+        self._with_retry(buy)
         write_log(self.name, "account", f"Bought {quantity} of {symbol}")
         return "Completed. Latest details:\n" + self.report()
 
     def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
         """ Sell shares of a stock if the user has enough shares. """
-        if self.holdings.get(symbol, 0) < quantity:
-            raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
-        
         price = get_share_price(symbol)
-        sell_price = price * (1 - SPREAD)
-        total_proceeds = sell_price * quantity
-        
-        # Update holdings
-        self.holdings[symbol] -= quantity
-        
-        # If shares are completely sold, remove from holdings
-        if self.holdings[symbol] == 0:
-            del self.holdings[symbol]
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # Record transaction
-        transaction = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
-        self.transactions.append(transaction)
+        sell_price_cents = add_basis_points(to_cents(price), -SPREAD_BASIS_POINTS)
+        total_proceeds_cents = sell_price_cents * quantity
+
+        def sell():
+            if self.holdings.get(symbol, 0) < quantity:
+                raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
+
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # Record transaction, which also updates holdings and removes them once completely sold
+            transaction = Transaction(symbol=symbol, quantity=-quantity, price_cents=sell_price_cents, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
+            self._append(transaction)
 
-        # Update balance
-        self.balance += total_proceeds
-        self.save()
+            # Update balance
+            self.balance_cents += total_proceeds_cents
+
+        self._with_retry(sell)
         write_log(self.name, "account", f"Sold {quantity} of {symbol}")
         return "Completed. Latest details:\n" + self.report()
 
     def calculate_portfolio_value(self):
         """ Calculate the total value of the user's portfolio. """
-        total_value = self.balance
-        for symbol, quantity in self.holdings.items():
-            total_value += get_share_price(symbol) * quantity
-        return total_value
+        prices = get_share_prices(list(self.holdings))
+        return self.balance + sum(prices[symbol] * quantity for symbol, quantity in self.holdings.items())
+
+    def calculate_risk(self) -> dict:
+        """ Value every position and measure the portfolio's risk in one batched pass. """
+        self._ensure_values()
+        symbols = list(self.holdings)
+        prices = get_share_prices(symbols)
+        return analyze(
+            self.balance,
+            symbols,
+            np.array([self.holdings[symbol] for symbol in symbols], dtype=float),
+            np.array([prices[symbol] for symbol in symbols], dtype=float),
+            np.array([to_dollars(self.ledger.position_cost(symbol)) for symbol in symbols], dtype=float),
+            np.array([value for _, value in self.portfolio_value_time_series], dtype=float),
+        )
 
     def calculate_profit_loss(self, portfolio_value: float):
         """ Calculate profit or loss from the initial spend. """
-        initial_spend = sum(transaction.total() for transaction in self.transactions)
-        return portfolio_value - initial_spend - self.balance
+        return to_dollars(to_cents(portfolio_value) - self.ledger.net_invested_cents - self.balance_cents)
+
+    def get_position_cost(self, symbol: str) -> float:
+        """ Report what was paid for the shares currently held of a symbol. """
+        return to_dollars(self.ledger.position_cost(symbol))
+
+    def get_average_price(self, symbol: str) -> float:
+        """ Report the average entry price of the shares currently held of a symbol. """
+        return self.ledger.average_price(symbol, self.holdings.get(symbol, 0))
+
+    def get_realized_profit_loss(self) -> float:
+        """ Report the profit or loss locked in by sales so far. """
+        return self.ledger.realized_pnl
 
     def get_holdings(self):
         """ Report the current holdings of the user. """
@@ -144,24 +354,78 @@ class Account(BaseModel):
 
     def get_profit_loss(self):
         """ Report the user's profit or loss at any point in time. """
-        return self.calculate_profit_loss()
+        return self.calculate_profit_loss(self.calculate_portfolio_value())
 
     def list_transactions(self):
         """ List all transactions made by the user. """
-        return [transaction.model_dump() for transaction in self.transactions]
+        return self._dump_transactions()
     
+    def _record_value(self) -> dict:
+        """ Value the account, add the value to its time series, and return the risk analysis. """
+        def record_value():
+            risk = self.calculate_risk()
+            self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), risk["total_value"]))
+            return risk
+
+        return self._with_retry(record_value)
+
     def report(self) -> str:
         """ Return a json string representing the account.  """
-        portfolio_value = self.calculate_portfolio_value()
-        self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value))
-        self.save()
+        risk = self._record_value()
+        portfolio_value = risk["total_value"]
         pnl = self.calculate_profit_loss(portfolio_value)
-        data = self.model_dump()
+        data = self.model_dump(exclude={"portfolio_value_time_series"})
+        data["transactions"] = self._dump_transactions()
         data["total_portfolio_value"] = portfolio_value
         data["total_profit_loss"] = pnl
+        data["risk"] = {key: risk[key] for key in ("largest_weight", "max_drawdown", "current_drawdown", "volatility")}
         write_log(self.name, "account", f"Retrieved account details")
         return json.dumps(data)
     
+    def summary(self, recent_trades: int = SUMMARY_RECENT_TRADES, token_budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+        """
+        A compact json view of the account for an agent's prompt: positions with their cost basis,
+        the most recent trades and aggregate figures. Unlike report(), its size doesn't grow with the
+        account's age. If it would exceed token_budget (estimated at CHARS_PER_TOKEN characters a token),
+        rationales are shortened and then the oldest of the recent trades dropped.
+        """
+        risk = self._record_value()
+        positions = {
+            symbol: {
+                "quantity": position["quantity"],
+                "price": position["price"],
+                "cost_basis": self.get_position_cost(symbol),
+                "unrealized_profit_loss": round(position["unrealized_profit_loss"], 2),
+            }
+            for symbol, position in risk["positions"].items()
+        }
+        data = {
+            "name": self.name,
+            "balance": self.balance,
+            "strategy": self.strategy,
+            "positions": positions,
+            "total_portfolio_value": round(risk["total_value"], 2),
+            "total_profit_loss": self.calculate_profit_loss(risk["total_value"]),
+            "realized_profit_loss": self.ledger.realized_pnl,
+            "net_invested": self.ledger.net_invested,
+            # Read rather than loaded, since _record_value() has just saved everything
+            "number_of_trades": read_transaction_count(self.name),
+            "risk": {key: round(risk[key], 4) for key in ("largest_weight", "max_drawdown", "current_drawdown", "volatility")},
+            "recent_trades": [_dump_transaction(record) for record in read_account_transactions(self.name, recent_trades)] if recent_trades else [],
+        }
+        budget = token_budget * CHARS_PER_TOKEN
+        rationale_length = 200
+        while len(json.dumps(data)) > budget and data["recent_trades"]:
+            if max(len(trade["rationale"]) for trade in data["recent_trades"]) > rationale_length:
+                for trade in data["recent_trades"]:
+                    trade["rationale"] = trade["rationale"][:rationale_length]
+            elif rationale_length > 20:
+                rationale_length //= 2
+            else:
+                data["recent_trades"].pop(0)
+        write_log(self.name, "account", f"Retrieved account summary")
+        return json.dumps(data)
+
     def get_strategy(self) -> str:
         """ Return the strategy of the account """
         write_log(self.name, "account", f"Retrieved strategy")
@@ -169,8 +433,10 @@ class Account(BaseModel):
     
     def change_strategy(self, strategy: str) -> str:
         """ At your discretion, if you choose to, call this to change your investment strategy for the future """
-        self.strategy = strategy
-        self.save()
+        def change():
+            self.strategy = strategy
+
+        self._with_retry(change)
         write_log(self.name, "account", f"Changed strategy")
         return "Changed strategy"
 
@@ -2,38 +2,197 @@ import mcp
 from mcp.client.stdio import stdio_client
 from mcp import StdioServerParameters
 from agents import FunctionTool
+import asyncio
 import json
+import os
+import threading
+import time
 
 params = StdioServerParameters(command="uv", args=["run", "accounts_server.py"], env=None)
 
+POOL_SIZE = int(os.getenv("ACCOUNTS_CLIENT_POOL_SIZE", "2"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("ACCOUNTS_CLIENT_MAX_CONCURRENCY", "16"))
+HEALTH_CHECK_AFTER_SECONDS = 30
+HEALTH_CHECK_TIMEOUT_SECONDS = 5
+
+# Tools that only read, so a call whose reply was lost can safely be sent again
+READ_ONLY_TOOLS = {"get_balance", "get_holdings", "get_portfolio_valuation", "get_risk_metrics"}
+
+
+class PooledSession:
+    """
+    One long-lived accounts server process and its MCP session.
+    The session is opened and closed by a dedicated owner task (MCP's stdio transport
+    must be exited from the task that entered it); callers on any task share it.
+    """
+
+    def __init__(self, params: StdioServerParameters):
+        self.params = params
+        self.session = None
+        self.last_ok = 0.0
+        self._task = None
+        self._stop = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> mcp.ClientSession:
+        """ Return a live session, starting it lazily and restarting it if it has died. """
+        async with self._lock:
+            if self._task is None or self._task.done():
+                await self._start()
+            elif time.monotonic() - self.last_ok > HEALTH_CHECK_AFTER_SECONDS and not await self.healthy():
+                await self.restart()
+            return self.session
+
+    async def healthy(self) -> bool:
+        if self.session is None or self._task is None or self._task.done():
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), HEALTH_CHECK_TIMEOUT_SECONDS)
+        except Exception:
+            return False
+        self.last_ok = time.monotonic()
+        return True
+
+    async def restart(self) -> None:
+        await self.close()
+        await self._start()
+
+    async def replace(self, failed: mcp.ClientSession) -> mcp.ClientSession | None:
+        """
+        After a request on the session `failed` raised, return a session to retry it on: restarting the
+        server unless another task already has, or None if the server is healthy and the error was the request's own.
+        """
+        async with self._lock:
+            if self.session is not None and self.session is not failed and not self._task.done():
+                return self.session
+            if await self.healthy():
+                return None
+            await self.restart()
+            return self.session
+
+    async def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._stop.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.session = None
+
+    async def _start(self) -> None:
+        ready = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run(ready))
+        await ready
+        self.last_ok = time.monotonic()
+
+    async def _run(self, ready: asyncio.Future) -> None:
+        try:
+            async with stdio_client(self.params) as streams:
+                async with mcp.ClientSession(*streams) as session:
+                    await session.initialize()
+                    self.session = session
+                    ready.set_result(None)
+                    await self._stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            self.session = None
+
+
+class AccountsClientPool:
+    """
+    A small pool of reusable accounts server sessions with a cap on concurrent requests,
+    so reading a resource costs one round trip rather than a `uv run` and an MCP handshake.
+    If a request fails because its server has died, the server is restarted and, if the request
+    is safe to repeat, retried once. A write may have run before the reply was lost, so it is never resent.
+    """
+
+    def __init__(self, params: StdioServerParameters, size: int = POOL_SIZE, max_concurrency: int = MAX_CONCURRENT_REQUESTS):
+        self.params = params
+        self.size = size
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._sessions = []
+        self._semaphore = None
+        self._next = 0
+
+    def _bind(self) -> None:
+        """ Sessions belong to one event loop, so start afresh if we're called from a new one. """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._abandon()
+            self._loop = loop
+            self._sessions = [PooledSession(self.params) for _ in range(self.size)]
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def run(self, request, retry: bool = True):
+        """ Call request(session) on a pooled session and return its result; pass retry=False for writes. """
+        self._bind()
+        async with self._semaphore:
+            pooled = self._sessions[self._next % self.size]
+            self._next += 1
+            session = await pooled.get()
+            try:
+                result = await request(session)
+            except Exception:
+                session = await pooled.replace(session)
+                if session is None or not retry:
+                    raise
+                result = await request(session)
+            pooled.last_ok = time.monotonic()
+            return result
+
+    def _abandon(self) -> None:
+        """
+        Close the sessions of the event loop we were bound to, on that loop. If it is still running, in
+        another thread, they're closed there; if it has stopped, it is run in a thread until they are.
+        A loop that asyncio.run() has closed cancelled their owner tasks, which ended the servers.
+        """
+        old, sessions = self._loop, [pooled for pooled in self._sessions if pooled._task is not None]
+        if old is None or old.is_closed() or not sessions:
+            return
+
+        async def close_all():
+            await asyncio.gather(*(pooled.close() for pooled in sessions))
+
+        if old.is_running():
+            asyncio.run_coroutine_threadsafe(close_all(), old)
+        else:
+            threading.Thread(target=old.run_until_complete, args=(close_all(),), daemon=True).start()
+
+    async def aclose(self) -> None:
+        if self._loop is asyncio.get_running_loop():
+            await asyncio.gather(*(pooled.close() for pooled in self._sessions))
+        self._sessions = []
+        self._loop = None
+
+
+pool = AccountsClientPool(params)
+
 
 async def list_accounts_tools():
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tools_result = await session.list_tools()
-            return tools_result.tools
-        
+    tools_result = await pool.run(lambda session: session.list_tools())
+    return tools_result.tools
+
 async def call_accounts_tool(tool_name, tool_args):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, tool_args)
-            return result
-            
+    return await pool.run(
+        lambda session: session.call_tool(tool_name, tool_args), retry=tool_name in READ_ONLY_TOOLS
+    )
+
 async def read_accounts_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://accounts_server/{name}")
-            return result.contents[0].text
-        
+    result = await pool.run(lambda session: session.read_resource(f"accounts://accounts_server/{name}"))
+    return result.contents[0].text
+
+async def read_summary_resource(name):
+    result = await pool.run(lambda session: session.read_resource(f"accounts://summary/{name}"))
+    return result.contents[0].text
+
 async def read_strategy_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://strategy/{name}")
-            return result.contents[0].text
+    result = await pool.run(lambda session: session.read_resource(f"accounts://strategy/{name}"))
+    return result.contents[0].text
+
+async def close_accounts_client():
+    await pool.aclose()
 
 async def get_accounts_tools_openai():
     openai_tools = []
@@ -44,7 +203,7 @@ async def get_accounts_tools_openai():
             description=tool.description,
             params_json_schema=schema,
             on_invoke_tool=lambda ctx, args, toolname=tool.name: call_accounts_tool(toolname, json.loads(args))
-                
+
         )
         openai_tools.append(openai_tool)
-    return openai_tools
\ No newline at end of file
+    return openai_tools
@@ -1,5 +1,8 @@
 from mcp.server.fastmcp import FastMCP
 from accounts import Account
+from database import close_sinks, read_balance, read_holdings
+from money import to_dollars
+from shutdown import on_terminate
 
 mcp = FastMCP("accounts_server")
 
@@ -10,7 +13,8 @@ async def get_balance(name: str) -> float:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).balance
+    balance_cents = read_balance(name)
+    return to_dollars(balance_cents) if balance_cents is not None else Account.get(name, history=False).balance
 
 @mcp.tool()
 async def get_holdings(name: str) -> dict[str, int]:
@@ -19,7 +23,9 @@ async def get_holdings(name: str) -> dict[str, int]:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).holdings
+    if read_balance(name) is None:
+        return Account.get(name, history=False).holdings
+    return read_holdings(name)
 
 @mcp.tool()
 async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> float:
@@ -31,7 +37,7 @@ async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> f
         quantity: The quantity of shares to buy
         rationale: The rationale for the purchase and fit with the account's strategy
     """
-    return Account.get(name).buy_shares(symbol, quantity, rationale)
+    return Account.get(name, history=False).buy_shares(symbol, quantity, rationale)
 
 
 @mcp.tool()
@@ -44,7 +50,27 @@ async def sell_shares(name: str, symbol: str, quantity: int, rationale: str) ->
         quantity: The quantity of shares to sell
         rationale: The rationale for the sale and fit with the account's strategy
     """
-    return Account.get(name).sell_shares(symbol, quantity, rationale)
+    return Account.get(name, history=False).sell_shares(symbol, quantity, rationale)
+
+@mcp.tool()
+async def get_portfolio_valuation(name: str) -> dict:
+    """Get the current value, weight and unrealized profit or loss of each position in the given account.
+
+    Args:
+        name: The name of the account holder
+    """
+    risk = Account.get(name, history=False).calculate_risk()
+    return {key: risk[key] for key in ("total_value", "cash", "invested_value", "unrealized_profit_loss", "positions")}
+
+@mcp.tool()
+async def get_risk_metrics(name: str) -> dict:
+    """Get risk measures for the given account: concentration, drawdown and rolling volatility of its value.
+
+    Args:
+        name: The name of the account holder
+    """
+    risk = Account.get(name, history=False).calculate_risk()
+    return {key: risk[key] for key in ("largest_weight", "concentration_hhi", "max_drawdown", "current_drawdown", "volatility")}
 
 @mcp.tool()
 async def change_strategy(name: str, strategy: str) -> str:
@@ -54,17 +80,24 @@ async def change_strategy(name: str, strategy: str) -> str:
         name: The name of the account holder
         strategy: The new strategy for the account
     """
-    return Account.get(name).change_strategy(strategy)
+    return Account.get(name, history=False).change_strategy(strategy)
 
 @mcp.resource("accounts://accounts_server/{name}")
 async def read_account_resource(name: str) -> str:
-    account = Account.get(name.lower())
+    account = Account.get(name.lower(), history=False)
     return account.report()
 
+@mcp.resource("accounts://summary/{name}")
+async def read_summary_resource(name: str) -> str:
+    account = Account.get(name.lower(), history=False)
+    return account.summary()
+
 @mcp.resource("accounts://strategy/{name}")
 async def read_strategy_resource(name: str) -> str:
-    account = Account.get(name.lower())
+    account = Account.get(name.lower(), history=False)
     return account.get_strategy()
 
 if __name__ == "__main__":
+    # Write the log rows still being batched before the server is stopped
+    on_terminate(close_sinks)
     mcp.run(transport='stdio')
\ No newline at end of file
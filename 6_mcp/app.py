@@ -1,10 +1,21 @@
+import threading
 import gradio as gr
 from util import css, js, Color
 import pandas as pd
 from trading_floor import names, lastnames, short_model_names
 import plotly.express as px
 from accounts import Account
-from database import read_log
+from database import (
+    log_channel,
+    read_account_resets,
+    read_account_version,
+    read_portfolio_series,
+    read_transactions_after,
+)
+from money import to_dollars
+from collections import deque
+from timeseries import downsample
+from metrics import span_report
 
 mapper = {
     "trace": Color.WHITE,
@@ -16,15 +27,61 @@ mapper = {
 }
 
 
+TRANSACTION_COLUMNS = ["Timestamp", "Symbol", "Quantity", "Price", "Rationale"]
+
+
 class Trader:
+    """
+    What the dashboard shows for one trader, shared by every browser session.
+    Each component is rebuilt only when the account's version shows that something changed,
+    and then only if its own data did; stamps() says which state each component is at.
+    Sessions refresh from several threads at once, so refreshes take turns under a lock.
+    """
+
     def __init__(self, name: str, lastname: str, model_name: str):
         self.name = name
         self.lastname = lastname
         self.model_name = model_name
-        self.account = Account.get(name)
+        self.account = None
+        self._stamps = {}
+        self._value_html = ""
+        self._chart = None
+        self._holdings_df = None
+        self._transactions_df = pd.DataFrame(columns=TRANSACTION_COLUMNS)
+        self._last_transaction_id = 0
+        self._resets = None
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self) -> dict:
+        """ Bring the components up to date if the account has changed; a single-row query if it hasn't. """
+        with self._lock:
+            version = read_account_version(self.name)
+            if self.account is None or version != self._stamps["version"]:
+                self.reload()
+            return self._stamps
 
     def reload(self):
-        self.account = Account.get(self.name)
+        with self._lock:
+            self.account = Account.get(self.name, history=False)
+            self._value_html = self._render_portfolio_value()
+            points = read_portfolio_series(self.name)
+            chart_stamp = (len(points), points[-1] if points else None)
+            if chart_stamp != self._stamps.get("chart"):
+                self._chart = self._render_portfolio_value_chart(points)
+            holdings_stamp = tuple(sorted(self.account.holdings.items()))
+            if holdings_stamp != self._stamps.get("holdings"):
+                self._holdings_df = self._render_holdings_df()
+            self._append_transactions()
+            self._stamps = {
+                "version": self.account.version,
+                "chart": chart_stamp,
+                "holdings": holdings_stamp,
+                "transactions": (self._resets, self._last_transaction_id),
+            }
+
+    def stamps(self) -> dict:
+        return self._stamps
 
     def get_title(self) -> str:
         return f"<div style='text-align: center;font-size:34px;'>{self.name}<span style='color:#ccc;font-size:24px;'> ({self.model_name}) - {self.lastname}</span></div>"
@@ -32,13 +89,11 @@ class Trader:
     def get_strategy(self) -> str:
         return self.account.get_strategy()
 
-    def get_portfolio_value_df(self) -> pd.DataFrame:
-        df = pd.DataFrame(self.account.portfolio_value_time_series, columns=["datetime", "value"])
-        df["datetime"] = pd.to_datetime(df["datetime"])
-        return df
-
     def get_portfolio_value_chart(self):
-        df = self.get_portfolio_value_df()
+        return self._chart
+
+    def _render_portfolio_value_chart(self, points):
+        df = downsample(points)
         fig = px.line(df, x="datetime", y="value")
         margin = dict(l=40, r=20, t=20, b=40)
         fig.update_layout(
@@ -54,6 +109,9 @@ class Trader:
         return fig
 
     def get_holdings_df(self) -> pd.DataFrame:
+        return self._holdings_df
+
+    def _render_holdings_df(self) -> pd.DataFrame:
         """Convert holdings to DataFrame for display"""
         holdings = self.account.get_holdings()
         if not holdings:
@@ -65,14 +123,32 @@ class Trader:
         return df
 
     def get_transactions_df(self) -> pd.DataFrame:
-        """Convert transactions to DataFrame for display"""
-        transactions = self.account.list_transactions()
-        if not transactions:
-            return pd.DataFrame(columns=["Timestamp", "Symbol", "Quantity", "Price", "Rationale"])
+        return self._transactions_df
 
-        return pd.DataFrame(transactions)
+    def _append_transactions(self):
+        """Add the transactions made since the last refresh to the table, starting over if the account was reset"""
+        resets = read_account_resets(self.name)
+        if resets != self._resets:
+            self._transactions_df = pd.DataFrame(columns=TRANSACTION_COLUMNS)
+            self._last_transaction_id = 0
+            self._resets = resets
+        rows = read_transactions_after(self.name, self._last_transaction_id)
+        if not rows:
+            return
+        self._last_transaction_id = rows[-1][0]
+        new = pd.DataFrame(
+            [
+                (timestamp, symbol, quantity, to_dollars(price_cents), rationale)
+                for _, timestamp, symbol, quantity, price_cents, rationale in rows
+            ],
+            columns=TRANSACTION_COLUMNS,
+        )
+        self._transactions_df = new if self._transactions_df.empty else pd.concat([self._transactions_df, new], ignore_index=True)
 
     def get_portfolio_value(self) -> str:
+        return self._value_html
+
+    def _render_portfolio_value(self) -> str:
         """Calculate total portfolio value based on current prices"""
         portfolio_value = self.account.calculate_portfolio_value() or 0.0
         pnl = self.account.calculate_profit_loss(portfolio_value) or 0.0
@@ -80,17 +156,20 @@ class Trader:
         emoji = "⬆" if pnl >= 0 else "⬇"
         return f"<div style='text-align: center;background-color:{color};'><span style='font-size:32px'>${portfolio_value:,.0f}</span><span style='font-size:24px'>&nbsp;&nbsp;&nbsp;{emoji}&nbsp;${pnl:,.0f}</span></div>"
 
-    def get_logs(self, previous=None) -> str:
-        logs = read_log(self.name, last_n=13)
+    def render_logs(self, logs) -> str:
         response = ""
         for log in logs:
-            timestamp, type, message = log
+            _, timestamp, type, message = log
             color = mapper.get(type, Color.WHITE).value
             response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
-        response = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
-        if response != previous:
-            return response
-        return gr.update()
+        return f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
+
+    async def stream_logs(self):
+        """Yield the log panel each time new entries arrive for this trader"""
+        logs = deque(maxlen=13)
+        async for new_logs in log_channel.subscribe(self.name, backlog=logs.maxlen):
+            logs.extend(new_logs)
+            yield self.render_logs(logs)
 
 
 class TraderView:
@@ -111,7 +190,7 @@ class TraderView:
                     self.trader.get_portfolio_value_chart, container=True, show_label=False
                 )
             with gr.Row(variant="panel"):
-                self.log = gr.HTML(self.trader.get_logs)
+                self.log = gr.HTML()
             with gr.Row():
                 self.holdings_table = gr.Dataframe(
                     value=self.trader.get_holdings_df,
@@ -133,35 +212,41 @@ class TraderView:
                     elem_classes=["dataframe-fix"],
                 )
 
+        # What this browser session is showing, so a refresh only sends the components that changed.
+        # Filled in when the page loads; gr.State deep-copies its initial value, and the Trader holds a lock
+        self.shown = gr.State({})
         timer = gr.Timer(value=120)
         timer.tick(
             fn=self.refresh,
-            inputs=[],
+            inputs=[self.shown],
             outputs=[
                 self.portfolio_value,
                 self.chart,
                 self.holdings_table,
                 self.transactions_table,
+                self.shown,
             ],
             show_progress="hidden",
             queue=False,
         )
-        log_timer = gr.Timer(value=0.5)
-        log_timer.tick(
-            fn=self.trader.get_logs,
-            inputs=[self.log],
-            outputs=[self.log],
-            show_progress="hidden",
-            queue=False,
-        )
 
-    def refresh(self):
-        self.trader.reload()
+    def shown_on_load(self) -> dict:
+        return dict(self.trader.stamps())
+
+    def refresh(self, shown: dict):
+        stamps = self.trader.refresh()
+        if stamps == shown:
+            return gr.skip(), gr.skip(), gr.skip(), gr.skip(), shown
+
+        def changed(key):
+            return stamps[key] != shown.get(key)
+
         return (
-            self.trader.get_portfolio_value(),
-            self.trader.get_portfolio_value_chart(),
-            self.trader.get_holdings_df(),
-            self.trader.get_transactions_df(),
+            self.trader.get_portfolio_value() if changed("version") else gr.skip(),
+            self.trader.get_portfolio_value_chart() if changed("chart") else gr.skip(),
+            self.trader.get_holdings_df() if changed("holdings") else gr.skip(),
+            self.trader.get_transactions_df() if changed("transactions") else gr.skip(),
+            stamps,
         )
 
 
@@ -181,6 +266,19 @@ def create_ui():
         with gr.Row():
             for trader_view in trader_views:
                 trader_view.make_ui()
+        with gr.Accordion("Latency and tokens, last 24 hours", open=False):
+            latency_table = gr.Dataframe(value=span_report, max_height=400, elem_classes=["dataframe-fix"])
+        gr.Timer(value=120).tick(fn=span_report, outputs=[latency_table], show_progress="hidden", queue=False)
+        for trader_view in trader_views:
+            ui.load(trader_view.shown_on_load, outputs=[trader_view.shown], show_progress="hidden", queue=False)
+        # Each browser session holds one log subscription per trader, so these must not queue behind each other
+        for trader_view in trader_views:
+            ui.load(
+                trader_view.trader.stream_logs,
+                outputs=[trader_view.log],
+                show_progress="hidden",
+                concurrency_limit=None,
+            )
 
     return ui
 
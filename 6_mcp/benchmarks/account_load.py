@@ -0,0 +1,78 @@
+"""
+Per-call latency of loading an account as its history grows.
+
+Compares a full Account.get(), which validates the history in pydantic-core, with skipping
+validation through model_construct(), with loading the account without its history, and with
+the single-field queries that get_balance and get_holdings use. Runs against a scratch database.
+
+    uv run benchmarks/account_load.py --lengths 10 100 1000 10000
+"""
+
+import argparse
+import timeit
+
+import scratch  # noqa: F401 - first, so the project runs against a scratch database
+from accounts import INITIAL_BALANCE_CENTS, Account, Transaction
+from database import read_account, read_balance, read_holdings, write_account
+from ledger import Ledger
+
+
+def make_account(name: str, length: int) -> None:
+    """ An account with `length` transactions and as many portfolio value points. """
+    transactions = [
+        {
+            "symbol": f"SYM{index % 20}",
+            "quantity": 1,
+            "price_cents": 10_000 + index,
+            "timestamp": "2025-01-01 00:00:00",
+            "rationale": "Benchmark trade with a rationale about as long as an agent would write",
+        }
+        for index in range(length)
+    ]
+    ledger, holdings = Ledger.replay((t["symbol"], t["quantity"], t["price_cents"]) for t in transactions)
+    write_account(name, {
+        "name": name,
+        "balance_cents": INITIAL_BALANCE_CENTS,
+        "strategy": "Benchmark",
+        "holdings": holdings,
+        "transactions": transactions,
+        "portfolio_value_time_series": [("2025-01-01 00:00:00", 10_000.0 + index) for index in range(length)],
+        "ledger": ledger.to_record(),
+    })
+
+
+def constructed(name: str) -> Account:
+    fields = read_account(name)
+    fields.pop("version")
+    transactions = [Transaction.model_construct(**transaction) for transaction in fields.pop("transactions")]
+    ledger = Ledger.model_construct(**fields.pop("ledger"))
+    return Account.model_construct(**fields, transactions=transactions, ledger=ledger)
+
+
+def per_call_us(function, number: int) -> float:
+    return min(timeit.repeat(function, number=number, repeat=3)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    paths = {
+        "get": lambda name: Account.get(name),
+        "model_construct": constructed,
+        "get(history=False)": lambda name: Account.get(name, history=False),
+        "read_balance": read_balance,
+        "read_holdings": read_holdings,
+    }
+    print(f"{'history':>8} " + " ".join(f"{path:>20}" for path in paths) + "   (microseconds per call)")
+    for length in args.lengths:
+        name = f"bench{length}"
+        make_account(name, length)
+        number = max(5, 20_000 // (length + 10))
+        timings = [per_call_us(lambda: load(name), number) for load in paths.values()]
+        print(f"{length:>8} " + " ".join(f"{timing:>20,.1f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+End-to-end cost of a trading cycle, replayed offline from a recorded cassette (see replay.py).
+
+Each cycle resets the traders' accounts and replays the recorded cycle against a scratch database,
+with the accounts and market servers in-process. Reports wall time, the SQLite statements executed
+(including the batched log and metrics writes) and the processes spawned per cycle - which should be
+none - so changes to accounts.py, database.py or traders.py that slow a cycle down show up here.
+
+    uv run replay.py record cycle.jsonl
+    uv run benchmarks/cycle.py cycle.jsonl --cycles 5
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+import scratch  # first, so the project runs against a scratch database
+from agents import set_trace_processors
+from database import close as close_database, flush_logs, metrics_sink
+from metrics import MetricsTracer
+from replay import Cassette, Replayer
+from tracers import LogTracer
+
+
+class Counters:
+    """ Counts SQLite statements on every connection, from any thread, and subprocesses started. """
+
+    def __init__(self):
+        self.statements = 0
+        self.spawns = 0
+        self._lock = threading.Lock()
+
+    def statement(self, _sql: str) -> None:
+        with self._lock:
+            self.statements += 1
+
+    def snapshot(self) -> tuple[int, int]:
+        with self._lock:
+            return self.statements, self.spawns
+
+
+counters = Counters()
+_sqlite_connect = sqlite3.connect
+
+
+def counting_connect(*args, **kwargs) -> sqlite3.Connection:
+    conn = _sqlite_connect(*args, **kwargs)
+    conn.set_trace_callback(counters.statement)
+    return conn
+
+
+class CountingPopen(subprocess.Popen):
+    def __init__(self, *args, **kwargs):
+        counters.spawns += 1
+        super().__init__(*args, **kwargs)
+
+
+sqlite3.connect = counting_connect
+subprocess.Popen = CountingPopen
+# Importing the project migrated the database on a pooled connection opened before the patch;
+# close it, so the replay's own statements on this thread are counted too
+close_database()
+
+
+def flush() -> None:
+    flush_logs()
+    metrics_sink.flush()
+
+
+async def measure(cassette: Cassette, cycles: int) -> list[dict]:
+    results = []
+    async with Replayer(cassette) as replayer:
+        for cycle in range(1, cycles + 1):
+            replayer.reset_accounts()
+            flush()
+            statements, spawns = counters.snapshot()
+            started = time.perf_counter()
+            await replayer.run_cycle()
+            flush()
+            elapsed = time.perf_counter() - started
+            after_statements, after_spawns = counters.snapshot()
+            results.append({
+                "cycle": cycle,
+                "seconds": elapsed,
+                "statements": after_statements - statements,
+                "spawns": after_spawns - spawns,
+                **cassette.stats,
+            })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassette", help="A cassette written by 'replay.py record'")
+    parser.add_argument("--cycles", type=int, default=3)
+    args = parser.parse_args()
+
+    set_trace_processors([LogTracer(), MetricsTracer()])
+    cassette = Cassette.load(os.path.join(scratch.STARTED_IN, args.cassette))
+    print(f"{'cycle':>6} {'seconds':>8} {'model calls':>12} {'replayed tools':>15} {'DB statements':>14} {'spawns':>7} {'misses':>7}")
+    for result in asyncio.run(measure(cassette, args.cycles)):
+        print(
+            f"{result['cycle']:>6} {result['seconds']:>8.3f} {result['model_calls']:>12} {result['tool_calls']:>15} "
+            f"{result['statements']:>14,} {result['spawns']:>7} {result['misses']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
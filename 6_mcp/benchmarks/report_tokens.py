@@ -0,0 +1,63 @@
+"""
+Prompt tokens spent on the account in each trade message, as a trader ages.
+
+Compares what Trader.get_account_report used to send - the full report with its whole
+transaction history - with the compact summary it sends now, for accounts with more and more
+trades. Tokens are counted with tiktoken when it's installed, otherwise estimated from length.
+Runs against a scratch database with simulated prices.
+
+    uv run benchmarks/report_tokens.py --trades 10 100 1000
+"""
+
+import argparse
+import json
+import random
+
+import scratch  # noqa: F401 - first, so the project runs against a scratch database
+from accounts import CHARS_PER_TOKEN, SUMMARY_TOKEN_BUDGET, Account
+from market_sim import DEFAULT_UNIVERSE
+
+try:
+    import tiktoken
+
+    encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(encoding.encode(text))
+except ImportError:
+    def count_tokens(text: str) -> int:
+        return len(text) // CHARS_PER_TOKEN
+
+
+def make_account(name: str, trades: int) -> Account:
+    rng = random.Random(trades)
+    account = Account.get(name)
+    account.reset("Benchmark strategy")
+    account.deposit(10_000_000)
+    for _ in range(trades):
+        symbol = rng.choice(DEFAULT_UNIVERSE[:10])
+        if account.holdings.get(symbol, 0) > 1 and rng.random() < 0.4:
+            account.sell_shares(symbol, 1, "Taking some profit after the recent run-up, in line with the strategy")
+        else:
+            account.buy_shares(symbol, rng.randint(1, 5), "Adding to a position where the research shows strong fundamentals")
+    return account
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print(f"token budget {SUMMARY_TOKEN_BUDGET}")
+    print(f"{'trades':>8} {'full report':>12} {'summary':>10} {'saved':>8}")
+    for trades in args.trades:
+        account = make_account(f"tokens{trades}", trades)
+        full = json.loads(account.report())
+        full.pop("portfolio_value_time_series", None)
+        full_tokens = count_tokens(json.dumps(full))
+        summary_tokens = count_tokens(account.summary())
+        print(f"{trades:>8} {full_tokens:>12,} {summary_tokens:>10,} {1 - summary_tokens / full_tokens:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
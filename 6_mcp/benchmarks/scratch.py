@@ -0,0 +1,22 @@
+"""
+Setup shared by the benchmarks, imported before anything from the project:
+
+    import scratch
+
+makes the project importable, moves into a fresh temporary directory so the databases the project
+opens there are scratch ones rather than the live accounts.db, and turns off Polygon so prices
+are simulated. STARTED_IN is the directory the benchmark was run from, for resolving its arguments.
+"""
+
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STARTED_IN = os.getcwd()
+sys.path.insert(0, os.path.dirname(HERE))
+os.chdir(tempfile.mkdtemp(prefix=os.path.splitext(os.path.basename(sys.argv[0]))[0] + "_"))
+
+import market  # noqa: E402
+
+market.polygon_api_key = None  # simulated prices only
@@ -0,0 +1,113 @@
+"""
+How the trading floor's bookkeeping scales with the number of traders.
+
+Runs N simulated traders, sharded across worker processes the same way as trading_floor.py,
+against a scratch database. Each simulated run does what an agent's tool calls would do -
+read its account and strategy, look up prices, buy and sell - without calling any LLMs,
+so the numbers measure our side of the system: trader-runs per hour and rows written per second.
+
+    uv run benchmarks/trading_floor_scale.py --traders 4 16 64 --workers 1 4 --cycles 3
+"""
+
+import argparse
+import multiprocessing
+import random
+import time
+
+import scratch  # noqa: F401 - first, so the project runs against a scratch database
+import market
+from accounts import Account
+from database import connect, flush_logs
+from market_sim import DEFAULT_UNIVERSE
+from trader_config import TraderConfig, shard
+
+COUNTED_TABLES = ["logs", "transactions", "portfolio_values"]
+
+
+def simulated_configs(count: int) -> list[TraderConfig]:
+    return [
+        TraderConfig(
+            name=f"Sim{index:03d}",
+            lastname="Simulated",
+            model_name="simulated",
+            short_model_name="Simulated",
+            strategy=f"Simulated trader {index}",
+        )
+        for index in range(count)
+    ]
+
+
+def simulated_run(name: str, rng: random.Random) -> None:
+    account = Account.get(name)
+    account.report()
+    account.get_strategy()
+    symbols = rng.sample(DEFAULT_UNIVERSE, 5)
+    market.get_share_prices(symbols)
+    for symbol in symbols[:2]:
+        try:
+            account.buy_shares(symbol, rng.randint(1, 3), "Simulated buy")
+        except ValueError:
+            pass  # out of cash, as an agent's tool call would be told
+    holdings = account.get_holdings()
+    if holdings:
+        symbol = rng.choice(sorted(holdings))
+        account.sell_shares(symbol, 1, "Simulated sell")
+    account.report()
+
+
+def run_worker(configs: list[TraderConfig], cycles: int, seed: int) -> int:
+    rng = random.Random(seed)
+    runs = 0
+    for _ in range(cycles):
+        for config in configs:
+            simulated_run(config.name, rng)
+            runs += 1
+    flush_logs()
+    return runs
+
+
+def row_count() -> int:
+    flush_logs()
+    return sum(connect().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in COUNTED_TABLES)
+
+
+def measure(traders: int, workers: int, cycles: int) -> dict:
+    configs = simulated_configs(traders)
+    for config in configs:
+        Account.get(config.name).reset(config.strategy)
+    rows_before = row_count()
+    context = multiprocessing.get_context("fork")
+    started = time.perf_counter()
+    with context.Pool(workers) as pool:
+        runs = sum(pool.starmap(run_worker, [(shard(configs, index, workers), cycles, index) for index in range(workers)]))
+    elapsed = time.perf_counter() - started
+    rows = row_count() - rows_before
+    return {
+        "traders": traders,
+        "workers": workers,
+        "runs": runs,
+        "seconds": elapsed,
+        "runs_per_hour": runs / elapsed * 3600,
+        "rows_per_second": rows / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--traders", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--cycles", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'traders':>8} {'workers':>8} {'runs':>6} {'seconds':>8} {'runs/hour':>12} {'rows/s':>10}")
+    for traders in args.traders:
+        for workers in args.workers:
+            result = measure(traders, min(workers, traders), args.cycles)
+            print(
+                f"{result['traders']:>8} {result['workers']:>8} {result['runs']:>6} {result['seconds']:>8.2f} "
+                f"{result['runs_per_hour']:>12,.0f} {result['rows_per_second']:>10,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,102 @@
 import sqlite3
 import json
-from datetime import datetime
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from log_sink import LogSink
+from log_stream import LogChannel
 
 load_dotenv(override=True)
 
 DB = "accounts.db"
 
+# Connection tuning: WAL lets the dashboard read while the accounts server writes,
+# synchronous=NORMAL only fsyncs at checkpoints, and busy_timeout makes writers queue
+# politely instead of failing with "database is locked"
+BUSY_TIMEOUT_MS = 5_000
+STATEMENT_CACHE_SIZE = 256
 
-with sqlite3.connect(DB) as conn:
-    cursor = conn.cursor()
-    cursor.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
-    cursor.execute('''
+# Portfolio values are kept as recorded for RAW_VALUES_DAYS, then as the last value in each minute
+# for MINUTE_VALUES_DAYS, and after that as hourly open/high/low/close; see compact_portfolio_values()
+RAW_VALUES_DAYS = 1
+MINUTE_VALUES_DAYS = 7
+
+# Logs older than this are moved out of the live database by archive_logs()
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "7"))
+LOG_ARCHIVE_DB = "logs_archive.db"
+
+_local = threading.local()
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Return the pooled connection for the current thread, opening it on first use.
+
+    Connections are kept per thread (sqlite3 connections can't be shared across threads)
+    and per process, so a forked worker never reuses its parent's handle.
+    Statements are cached by their SQL text, so each query is only prepared once per connection.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    conn = sqlite3.connect(
+        DB,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def close() -> None:
+    """Close the current thread's pooled connection, if it has one."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+def use_database(path: str) -> None:
+    """
+    Point this process at another database file, such as a scratch one for a replay, and migrate it.
+    Call it before anything is logged: the log and metrics sinks' threads keep the connections they have.
+    """
+    global DB
+    close()
+    DB = path
+    migrate()
+
+
+@contextmanager
+def transaction():
+    """
+    Run a block of statements as a single write transaction and commit once at the end.
+    BEGIN IMMEDIATE takes the write lock up front, so concurrent writers wait on busy_timeout
+    rather than failing halfway through. Nested use joins the outer transaction.
+    """
+    conn = connect()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _migrate_initial_schema(conn: sqlite3.Connection) -> None:
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT,
@@ -20,82 +105,838 @@ with sqlite3.connect(DB) as conn:
             message TEXT
         )
     ''')
-    cursor.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
-    conn.commit()
-
-def write_account(name, account_dict):
-    json_data = json.dumps(account_dict)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO accounts (name, account)
-            VALUES (?, ?)
-            ON CONFLICT(name) DO UPDATE SET account=excluded.account
-        ''', (name.lower(), json_data))
-        conn.commit()
-
-def read_account(name):
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT account FROM accounts WHERE name = ?', (name.lower(),))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
-    
+    conn.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
+
+
+def _migrate_normalized_accounts(conn: sqlite3.Connection) -> None:
+    """Split the one-JSON-blob-per-trader accounts table into relational tables"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(accounts)")]
+    if "account" in columns:
+        conn.execute("ALTER TABLE accounts RENAME TO accounts_legacy")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            name TEXT PRIMARY KEY,
+            balance REAL NOT NULL,
+            strategy TEXT NOT NULL DEFAULT ''
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS holdings (
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (name, symbol)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            timestamp TEXT NOT NULL,
+            rationale TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS transactions_name_id ON transactions (name, id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_values (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            value REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS portfolio_values_name_id ON portfolio_values (name, id)')
+    if "account" in columns:
+        for name, blob in conn.execute("SELECT name, account FROM accounts_legacy").fetchall():
+            account = json.loads(blob)
+            conn.execute(
+                'INSERT INTO accounts (name, balance, strategy) VALUES (?, ?, ?)',
+                (name, account["balance"], account["strategy"]),
+            )
+            conn.executemany(
+                'INSERT INTO holdings (name, symbol, quantity) VALUES (?, ?, ?)',
+                [(name, symbol, quantity) for symbol, quantity in account["holdings"].items()],
+            )
+            conn.executemany(
+                '''
+                INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''',
+                [
+                    (name, t["symbol"], t["quantity"], t["price"], t["timestamp"], t["rationale"])
+                    for t in account["transactions"]
+                ],
+            )
+            conn.executemany(
+                'INSERT INTO portfolio_values (name, datetime, value) VALUES (?, ?, ?)',
+                [(name, timestamp, value) for timestamp, value in account["portfolio_value_time_series"]],
+            )
+        conn.execute("DROP TABLE accounts_legacy")
+
+
+def _migrate_ledger_aggregates(conn: sqlite3.Connection) -> None:
+    """Add the running P&L aggregates and backfill them by replaying each ledger"""
+    conn.execute("ALTER TABLE accounts ADD COLUMN realized_pnl REAL NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE accounts ADD COLUMN net_invested REAL NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE holdings ADD COLUMN cost_basis REAL NOT NULL DEFAULT 0")
+    for (name,) in conn.execute("SELECT name FROM accounts").fetchall():
+        rows = conn.execute(
+            'SELECT symbol, quantity, price FROM transactions WHERE name = ? ORDER BY id', (name,)
+        ).fetchall()
+        # The average cost method, in dollars as amounts were at this version; see Ledger.record
+        cost_basis, held, realized_pnl, net_invested = {}, {}, 0.0, 0.0
+        for symbol, quantity, price in rows:
+            net_invested += quantity * price
+            cost, shares = cost_basis.get(symbol, 0.0), held.get(symbol, 0)
+            if quantity > 0:
+                cost_basis[symbol] = cost + quantity * price
+            else:
+                released = cost * -quantity / shares if shares else 0.0
+                realized_pnl += -quantity * price - released
+                cost_basis[symbol] = cost - released
+            held[symbol] = shares + quantity
+        conn.execute(
+            'UPDATE accounts SET realized_pnl = ?, net_invested = ? WHERE name = ?',
+            (realized_pnl, net_invested, name),
+        )
+        conn.executemany(
+            'UPDATE holdings SET cost_basis = ? WHERE name = ? AND symbol = ?',
+            [(cost, name, symbol) for symbol, cost in cost_basis.items() if held[symbol]],
+        )
+
+
+def _migrate_logs_index(conn: sqlite3.Connection) -> None:
+    conn.execute('CREATE INDEX IF NOT EXISTS logs_name_id ON logs (name, id)')
+
+
+def _migrate_price_cache(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS prices (
+            symbol TEXT PRIMARY KEY,
+            price REAL NOT NULL,
+            fetched_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _migrate_market_rows(conn: sqlite3.Connection) -> None:
+    """Replace the JSON document per date with one compact (day, ticker id, close) row per price"""
+    conn.execute('CREATE TABLE IF NOT EXISTS tickers (id INTEGER PRIMARY KEY, ticker TEXT NOT NULL UNIQUE)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS market_prices (
+            day INTEGER NOT NULL,
+            ticker_id INTEGER NOT NULL,
+            close REAL NOT NULL,
+            PRIMARY KEY (day, ticker_id)
+        ) WITHOUT ROWID
+    ''')
+    for date, data in conn.execute("SELECT date, data FROM market").fetchall():
+        _insert_market(conn, date, json.loads(data))
+    conn.execute("DROP TABLE market")
+
+
+def _migrate_account_versions(conn: sqlite3.Connection) -> None:
+    """Version each account row, so concurrent writers can detect that they read stale state"""
+    conn.execute("ALTER TABLE accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_integer_cents(conn: sqlite3.Connection) -> None:
+    """
+    Store money as integer cents rather than floats. SQLite keeps a column's declared affinity,
+    so the tables are rebuilt with INTEGER columns and the amounts rounded to the cent on the way.
+    The P&L aggregates and cost bases aren't rounded from their dollar totals: they are rebuilt by
+    replaying the rounded transaction prices, so they agree with ledger.verify() to the cent.
+    """
+    from ledger import Ledger
+
+    conn.execute('''
+        CREATE TABLE accounts_cents (
+            name TEXT PRIMARY KEY,
+            balance_cents INTEGER NOT NULL,
+            strategy TEXT NOT NULL DEFAULT '',
+            realized_pnl_cents INTEGER NOT NULL DEFAULT 0,
+            net_invested_cents INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO accounts_cents
+        SELECT name, CAST(round(balance * 100) AS INTEGER), strategy, 0, 0, version FROM accounts
+    ''')
+    conn.execute('''
+        CREATE TABLE holdings_cents (
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            cost_basis_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, symbol)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO holdings_cents
+        SELECT name, symbol, quantity, 0 FROM holdings
+    ''')
+    conn.execute('''
+        CREATE TABLE transactions_cents (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price_cents INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            rationale TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO transactions_cents
+        SELECT id, name, symbol, quantity, CAST(round(price * 100) AS INTEGER), timestamp, rationale FROM transactions
+    ''')
+    for (name,) in conn.execute("SELECT name FROM accounts_cents").fetchall():
+        ledger, _ = Ledger.replay(
+            conn.execute(
+                'SELECT symbol, quantity, price_cents FROM transactions_cents WHERE name = ? ORDER BY id', (name,)
+            ).fetchall()
+        )
+        conn.execute(
+            'UPDATE accounts_cents SET realized_pnl_cents = ?, net_invested_cents = ? WHERE name = ?',
+            (ledger.realized_pnl_cents, ledger.net_invested_cents, name),
+        )
+        conn.executemany(
+            'UPDATE holdings_cents SET cost_basis_cents = ? WHERE name = ? AND symbol = ?',
+            [(cost, name, symbol) for symbol, cost in ledger.cost_basis_cents.items()],
+        )
+    for table in ("accounts", "holdings", "transactions"):
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_cents RENAME TO {table}")
+    conn.execute('CREATE INDEX transactions_name_id ON transactions (name, id)')
+
+
+def _migrate_portfolio_value_tiers(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE portfolio_minutes (
+            name TEXT NOT NULL,
+            minute TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (name, minute)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE portfolio_hours (
+            name TEXT NOT NULL,
+            hour TEXT NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            PRIMARY KEY (name, hour)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _migrate_span_metrics(conn: sqlite3.Connection) -> None:
+    """One row per finished tracing span: how long it took and, for model calls, how many tokens it used"""
+    conn.execute('''
+        CREATE TABLE span_metrics (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            span_type TEXT NOT NULL,
+            label TEXT NOT NULL,
+            server TEXT,
+            started TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            input_tokens INTEGER,
+            output_tokens INTEGER,
+            error INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute("CREATE INDEX span_metrics_started ON span_metrics (started)")
+
+
+def _migrate_research_cache(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE research_cache (
+            key TEXT PRIMARY KEY,
+            tool TEXT NOT NULL,
+            result TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _migrate_account_resets(conn: sqlite3.Connection) -> None:
+    """Count resets, so readers can tell one from trades however transaction ids and counts line up"""
+    conn.execute("ALTER TABLE accounts ADD COLUMN resets INTEGER NOT NULL DEFAULT 0")
+
+
+# Schema changes, applied in order; PRAGMA user_version records how many have run.
+# Append new migrations to the end of this list - never edit or reorder the existing ones
+MIGRATIONS = [
+    _migrate_initial_schema,
+    _migrate_normalized_accounts,
+    _migrate_ledger_aggregates,
+    _migrate_logs_index,
+    _migrate_price_cache,
+    _migrate_market_rows,
+    _migrate_account_versions,
+    _migrate_integer_cents,
+    _migrate_portfolio_value_tiers,
+    _migrate_span_metrics,
+    _migrate_research_cache,
+    _migrate_account_resets,
+]
+
+
+def migrate() -> None:
+    with transaction() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for step in MIGRATIONS[version:]:
+            step(conn)
+        conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+
+
+class StaleAccountError(Exception):
+    """Raised when an account was changed by someone else since it was read"""
+
+
+def _insert_account(
+    conn: sqlite3.Connection, name: str, account_dict: dict, version: int = 0, resets: int = 0, if_missing: bool = False
+) -> bool:
+    """Insert an account's rows; with if_missing, only if it doesn't exist yet. Returns whether it was inserted."""
+    ledger = account_dict["ledger"]
+    inserted = conn.execute(
+        f'''
+        INSERT INTO accounts (name, balance_cents, strategy, realized_pnl_cents, net_invested_cents, version, resets)
+        VALUES (?, ?, ?, ?, ?, ?, ?) {"ON CONFLICT(name) DO NOTHING" if if_missing else ""}
+        ''',
+        (
+            name,
+            account_dict["balance_cents"],
+            account_dict["strategy"],
+            ledger["realized_pnl_cents"],
+            ledger["net_invested_cents"],
+            version,
+            resets,
+        ),
+    ).rowcount
+    if not inserted:
+        return False
+    conn.executemany(
+        'INSERT INTO holdings (name, symbol, quantity, cost_basis_cents) VALUES (?, ?, ?, ?)',
+        [
+            (name, symbol, quantity, ledger["cost_basis_cents"].get(symbol, 0))
+            for symbol, quantity in account_dict["holdings"].items()
+        ],
+    )
+    _append_transactions(conn, name, account_dict["transactions"])
+    _append_portfolio_values(conn, name, account_dict["portfolio_value_time_series"])
+    return True
+
+
+def _append_transactions(conn: sqlite3.Connection, name: str, transactions: list[dict]) -> None:
+    conn.executemany(
+        '''
+        INSERT INTO transactions (name, symbol, quantity, price_cents, timestamp, rationale)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''',
+        [(name, t["symbol"], t["quantity"], t["price_cents"], t["timestamp"], t["rationale"]) for t in transactions],
+    )
+
+
+def _append_portfolio_values(conn: sqlite3.Connection, name: str, points: list) -> None:
+    conn.executemany(
+        'INSERT INTO portfolio_values (name, datetime, value) VALUES (?, ?, ?)',
+        [(name, timestamp, value) for timestamp, value in points],
+    )
+
+
+def create_account(name, account_dict) -> bool:
+    """
+    Create an account unless it already exists, in which case it - and its version - are left alone.
+    Two processes can race to create the same account; only one wins. Returns whether this call created it.
+    """
+    with transaction() as conn:
+        return _insert_account(conn, name.lower(), account_dict, if_missing=True)
+
+
+def write_account(name, account_dict) -> int:
+    """
+    Replace every row belonging to an account - used when it is created or reset.
+    The version carries on from the replaced row, so anyone holding the old state is seen to be stale,
+    and the resets count goes up by one. Returns the new version.
+    """
+    name = name.lower()
+    with transaction() as conn:
+        row = conn.execute('SELECT version, resets FROM accounts WHERE name = ?', (name,)).fetchone()
+        version, resets = (row[0] + 1, row[1] + 1) if row else (0, 0)
+        for table in ("accounts", "holdings", "transactions", "portfolio_values", "portfolio_minutes", "portfolio_hours"):
+            conn.execute(f'DELETE FROM {table} WHERE name = ?', (name,))
+        _insert_account(conn, name, account_dict, version, resets)
+    return version
+
+
+def write_account_changes(
+    name: str,
+    fields: dict,
+    holdings: dict[str, tuple[int, float]],
+    transactions: list[dict],
+    portfolio_values: list,
+    version: int,
+) -> int:
+    """
+    Persist only what changed on an account, in one transaction, provided nobody else has
+    changed it since it was read at `version`. This is optimistic concurrency: the accounts row
+    is only updated if its version still matches, otherwise nothing is written and
+    StaleAccountError is raised, and the caller should re-read the account and try again.
+
+    Args:
+        name (str): The account name
+        fields (dict): balance_cents, strategy, realized_pnl_cents and net_invested_cents for the accounts row
+        holdings (dict): (quantity, cost_basis_cents) for each symbol that changed; a quantity of 0 removes the holding
+        transactions (list): Transactions appended since the last save
+        portfolio_values (list): (datetime, value) points appended since the last save
+        version (int): The version of the account these changes were made to
+
+    Returns:
+        int: The account's new version
+    """
+    name = name.lower()
+    with transaction() as conn:
+        updated = conn.execute(
+            '''
+            UPDATE accounts SET
+                balance_cents=:balance_cents,
+                strategy=:strategy,
+                realized_pnl_cents=:realized_pnl_cents,
+                net_invested_cents=:net_invested_cents,
+                version=version + 1
+            WHERE name = :name AND version = :version
+            ''',
+            {"name": name, "version": version, **fields},
+        ).rowcount
+        if not updated:
+            raise StaleAccountError(f"Account {name} has changed since version {version}")
+        conn.executemany(
+            '''
+            INSERT INTO holdings (name, symbol, quantity, cost_basis_cents) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name, symbol) DO UPDATE SET quantity=excluded.quantity, cost_basis_cents=excluded.cost_basis_cents
+            ''',
+            [(name, symbol, quantity, cost) for symbol, (quantity, cost) in holdings.items() if quantity],
+        )
+        conn.executemany(
+            'DELETE FROM holdings WHERE name = ? AND symbol = ?',
+            [(name, symbol) for symbol, (quantity, _) in holdings.items() if not quantity],
+        )
+        _append_transactions(conn, name, transactions)
+        _append_portfolio_values(conn, name, portfolio_values)
+    return version + 1
+
+
+def read_account_history(name: str) -> tuple[list[dict], list[tuple[str, float]]]:
+    """Read an account's transactions and portfolio value points, oldest first"""
+    return read_account_transactions(name), read_portfolio_series(name)
+
+
+def read_account_transactions(name: str, limit: int | None = None) -> list[dict]:
+    """An account's transactions as stored, oldest first; with a limit, just that many of the most recent"""
+    rows = connect().execute(
+        '''
+        SELECT symbol, quantity, price_cents, timestamp, rationale FROM transactions
+        WHERE name = ? ORDER BY id DESC LIMIT ?
+        ''',
+        (name.lower(), -1 if limit is None else limit),
+    ).fetchall()
+    rows.reverse()
+    return [
+        {"symbol": symbol, "quantity": quantity, "price_cents": price_cents, "timestamp": timestamp, "rationale": rationale}
+        for symbol, quantity, price_cents, timestamp, rationale in rows
+    ]
+
+
+def read_transaction_count(name: str) -> int:
+    return connect().execute('SELECT count(*) FROM transactions WHERE name = ?', (name.lower(),)).fetchone()[0]
+
+
+def read_portfolio_series(name: str) -> list[tuple[str, float]]:
+    """
+    An account's portfolio value over time, oldest first: the hourly closes, then the minute buckets,
+    then the recent raw points. Each tier only covers times older than the next one.
+    """
+    name = name.lower()
+    conn = connect()
+    hours = conn.execute('SELECT hour, close FROM portfolio_hours WHERE name = ? ORDER BY hour', (name,))
+    minutes = conn.execute('SELECT minute, value FROM portfolio_minutes WHERE name = ? ORDER BY minute', (name,))
+    raw = conn.execute('SELECT datetime, value FROM portfolio_values WHERE name = ? ORDER BY id', (name,))
+    return hours.fetchall() + minutes.fetchall() + raw.fetchall()
+
+
+def compact_portfolio_values(now: datetime | None = None) -> tuple[int, int]:
+    """
+    Roll raw portfolio values older than RAW_VALUES_DAYS up into minute buckets, and minute buckets
+    older than MINUTE_VALUES_DAYS up into hourly open/high/low/close, so each account's series stays
+    bounded however often its value is recorded. Times are local, as Account.report() records them.
+    Returns the number of raw points and minute buckets that were rolled up.
+    """
+    now = now or datetime.now()
+    raw_cutoff = (now - timedelta(days=RAW_VALUES_DAYS)).strftime("%Y-%m-%d %H:%M:00")
+    minute_cutoff = (now - timedelta(days=MINUTE_VALUES_DAYS)).strftime("%Y-%m-%d %H:00:00")
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO portfolio_minutes (name, minute, value)
+            SELECT name, substr(datetime, 1, 16) || ':00', value FROM portfolio_values
+            WHERE id IN (
+                SELECT max(id) FROM portfolio_values WHERE datetime < ?
+                GROUP BY name, substr(datetime, 1, 16)
+            )
+            ON CONFLICT(name, minute) DO UPDATE SET value=excluded.value
+        ''', (raw_cutoff,))
+        raw = conn.execute('DELETE FROM portfolio_values WHERE datetime < ?', (raw_cutoff,)).rowcount
+        conn.execute('''
+            INSERT INTO portfolio_hours (name, hour, open, high, low, close)
+            SELECT DISTINCT name, hour,
+                first_value(value) OVER hour_window,
+                max(value) OVER hour_window,
+                min(value) OVER hour_window,
+                last_value(value) OVER hour_window
+            FROM (SELECT name, substr(minute, 1, 13) || ':00:00' AS hour, minute, value
+                  FROM portfolio_minutes WHERE minute < ?)
+            WHERE true
+            WINDOW hour_window AS (
+                PARTITION BY name, hour ORDER BY minute ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+            )
+            ON CONFLICT(name, hour) DO UPDATE SET
+                high=max(high, excluded.high), low=min(low, excluded.low), close=excluded.close
+        ''', (minute_cutoff,))
+        minutes = conn.execute('DELETE FROM portfolio_minutes WHERE minute < ?', (minute_cutoff,)).rowcount
+    return raw, minutes
+
+
+def read_account(name, history: bool = True):
+    """
+    Read an account's rows. With history=False the transactions and portfolio value points,
+    which grow without limit, are left out and returned as empty lists.
+    """
+    name = name.lower()
+    conn = connect()
+    row = conn.execute(
+        'SELECT balance_cents, strategy, realized_pnl_cents, net_invested_cents, version FROM accounts WHERE name = ?', (name,)
+    ).fetchone()
+    if not row:
+        return None
+    balance_cents, strategy, realized_pnl_cents, net_invested_cents, version = row
+    holdings = conn.execute(
+        'SELECT symbol, quantity, cost_basis_cents FROM holdings WHERE name = ?', (name,)
+    ).fetchall()
+    transactions, points = read_account_history(name) if history else ([], [])
+    return {
+        "name": name,
+        "balance_cents": balance_cents,
+        "strategy": strategy,
+        "holdings": {symbol: quantity for symbol, quantity, _ in holdings},
+        "transactions": transactions,
+        "portfolio_value_time_series": points,
+        "ledger": {
+            "cost_basis_cents": {symbol: cost for symbol, _, cost in holdings},
+            "realized_pnl_cents": realized_pnl_cents,
+            "net_invested_cents": net_invested_cents,
+        },
+        "version": version,
+    }
+
+
+def read_balance(name: str) -> int | None:
+    """Just the cash balance in cents, or None if there is no such account"""
+    row = connect().execute('SELECT balance_cents FROM accounts WHERE name = ?', (name.lower(),)).fetchone()
+    return row[0] if row else None
+
+
+def read_account_version(name: str) -> int | None:
+    """The account's version, which changes whenever anything in it does; None if there is no such account"""
+    row = connect().execute('SELECT version FROM accounts WHERE name = ?', (name.lower(),)).fetchone()
+    return row[0] if row else None
+
+
+def read_account_resets(name: str) -> int | None:
+    """How many times the account has been reset; transaction ids are reused across resets. None if there is no such account"""
+    row = connect().execute('SELECT resets FROM accounts WHERE name = ?', (name.lower(),)).fetchone()
+    return row[0] if row else None
+
+
+def read_transactions_after(name: str, last_id: int = 0) -> list[tuple]:
+    """An account's transactions with an id above last_id, oldest first, as (id, timestamp, symbol, quantity, price_cents, rationale)"""
+    cursor = connect().execute(
+        '''
+        SELECT id, timestamp, symbol, quantity, price_cents, rationale FROM transactions
+        WHERE name = ? AND id > ? ORDER BY id
+        ''',
+        (name.lower(), last_id),
+    )
+    return cursor.fetchall()
+
+
+def read_holdings(name: str) -> dict[str, int]:
+    cursor = connect().execute('SELECT symbol, quantity FROM holdings WHERE name = ?', (name.lower(),))
+    return dict(cursor.fetchall())
+
+
+def read_account_names() -> list[str]:
+    return [name for (name,) in connect().execute('SELECT name FROM accounts ORDER BY name')]
+
+
+def _write_logs(rows: list[tuple]) -> None:
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO logs (name, datetime, type, message)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
+    log_channel.notify()
+
+
+# Logs are written in batches on a background thread rather than one commit per entry,
+# and pushed to anyone in this process who subscribed to them
+log_sink = LogSink(_write_logs)
+log_channel = LogChannel()
+
+
 def write_log(name: str, type: str, message: str):
     """
-    Write a log entry to the logs table.
-    
+    Write a log entry to the logs table. The entry is queued and committed with others
+    shortly afterwards; call flush_logs() to wait until it has been written.
+
     Args:
         name (str): The name associated with the log
         type (str): The type of log entry
         message (str): The log message
     """
-    now = datetime.now().isoformat()
-    
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO logs (name, datetime, type, message)
-            VALUES (?, datetime('now'), ?, ?)
-        ''', (name.lower(), type, message))
-        conn.commit()
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    log_sink.submit((name.lower(), now, type, message))
+
+
+def flush_logs() -> None:
+    log_sink.flush()
+
+def close_sinks() -> None:
+    """Write the queued log and metrics rows and stop their writers; see shutdown.on_terminate()"""
+    log_sink.shutdown()
+    metrics_sink.shutdown()
 
 def read_log(name: str, last_n=10):
     """
     Read the most recent log entries for a given name.
-    
+
     Args:
         name (str): The name to retrieve logs for
         last_n (int): Number of most recent entries to retrieve
-        
+
     Returns:
         list: A list of tuples containing (datetime, type, message)
     """
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT datetime, type, message FROM logs 
-            WHERE name = ? 
-            ORDER BY datetime DESC
-            LIMIT ?
-        ''', (name.lower(), last_n))
-        
-        return reversed(cursor.fetchall())
+    cursor = connect().execute('''
+        SELECT datetime, type, message FROM logs
+        WHERE name = ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_n))
+    return reversed(cursor.fetchall())
+
+def read_log_since(name: str, last_id: int = 0, limit: int = 100) -> list[tuple]:
+    """
+    Read log entries for a given name that were written after last_id, oldest first.
+    With last_id=0 this returns the most recent `limit` entries, so a caller can start
+    a cursor and then pass the id of the last row it has seen to fetch only new ones.
+
+    Args:
+        name (str): The name to retrieve logs for
+        last_id (int): The id of the last entry already seen
+        limit (int): The maximum number of entries to return
+
+    Returns:
+        list: A list of tuples containing (id, datetime, type, message)
+    """
+    cursor = connect().execute('''
+        SELECT id, datetime, type, message FROM logs
+        WHERE name = ? AND id > ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_id, limit))
+    return cursor.fetchall()[::-1]
+
+def read_logs_after(last_id: int, limit: int = 1000) -> list[tuple]:
+    """Read log entries for all names written after last_id, as (id, name, datetime, type, message)"""
+    cursor = connect().execute('''
+        SELECT id, name, datetime, type, message FROM logs
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (last_id, limit))
+    return cursor.fetchall()
+
+def last_log_id() -> int:
+    return connect().execute('SELECT max(id) FROM logs').fetchone()[0] or 0
+
+def archive_logs(retention_days: int = LOG_RETENTION_DAYS, batch_size: int = 10_000) -> int:
+    """
+    Move log entries older than the retention period into the archive database,
+    so the live logs table stays small. Returns the number of entries archived.
+    """
+    conn = connect()
+    conn.execute("ATTACH DATABASE ? AS archive", (LOG_ARCHIVE_DB,))
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archive.logs (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                datetime DATETIME,
+                type TEXT,
+                message TEXT
+            )
+        ''')
+        archived = 0
+        while True:
+            with transaction():
+                # ids follow insertion time, so only the oldest batch_size rows need checking
+                cutoff = conn.execute('''
+                    SELECT max(id) FROM (SELECT id, datetime FROM logs ORDER BY id LIMIT ?)
+                    WHERE datetime < datetime('now', ?)
+                ''', (batch_size, f"-{retention_days} days")).fetchone()[0]
+                if cutoff is None:
+                    break
+                conn.execute('''
+                    INSERT OR IGNORE INTO archive.logs SELECT id, name, datetime, type, message
+                    FROM logs WHERE id <= ?
+                ''', (cutoff,))
+                moved = conn.execute("DELETE FROM logs WHERE id <= ?", (cutoff,)).rowcount
+            archived += moved
+    finally:
+        conn.execute("DETACH DATABASE archive")
+    return archived
+
+def _write_span_metrics(rows: list[tuple]) -> None:
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO span_metrics (name, span_type, label, server, started, duration_ms, input_tokens, output_tokens, error)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+
+# Span metrics are batched the same way as logs, so tracing never waits on SQLite
+metrics_sink = LogSink(_write_span_metrics)
+
+
+def write_span_metric(
+    name: str,
+    span_type: str,
+    label: str,
+    server: str | None,
+    started: str,
+    duration_ms: float,
+    input_tokens: int | None = None,
+    output_tokens: int | None = None,
+    error: bool = False,
+) -> None:
+    metrics_sink.submit((name.lower(), span_type, label, server, started, duration_ms, input_tokens, output_tokens, int(error)))
+
+
+def read_span_metrics(since: str, name: str | None = None) -> list[tuple]:
+    """
+    Span metrics recorded since a UTC timestamp ('YYYY-MM-DD HH:MM:SS'), optionally for one trader,
+    as (name, span_type, label, server, duration_ms, input_tokens, output_tokens, error)
+    """
+    query = '''
+        SELECT name, span_type, label, server, duration_ms, input_tokens, output_tokens, error
+        FROM span_metrics WHERE started >= ?
+    '''
+    params = [since]
+    if name:
+        query += " AND name = ?"
+        params.append(name.lower())
+    return connect().execute(query, params).fetchall()
+
+
+def prune_span_metrics(retention_days: int = LOG_RETENTION_DAYS) -> int:
+    """Delete span metrics older than the log retention period; returns how many were deleted"""
+    with transaction() as conn:
+        return conn.execute(
+            "DELETE FROM span_metrics WHERE started < datetime('now', ?)", (f"-{retention_days} days",)
+        ).rowcount
+
+
+def _day(date: str) -> int:
+    """Market dates are stored as YYYYMMDD integers, which SQLite packs into 4 bytes"""
+    return int(date.replace("-", ""))
+
+def _insert_market(conn: sqlite3.Connection, date: str, data: dict) -> None:
+    conn.executemany('INSERT OR IGNORE INTO tickers (ticker) VALUES (?)', [(ticker,) for ticker in data])
+    ids = dict(conn.execute('SELECT ticker, id FROM tickers'))
+    conn.executemany(
+        'INSERT OR REPLACE INTO market_prices (day, ticker_id, close) VALUES (?, ?, ?)',
+        [(_day(date), ids[ticker], close) for ticker, close in data.items() if close is not None],
+    )
 
 def write_market(date: str, data: dict) -> None:
-    data_json = json.dumps(data)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO market (date, data)
-            VALUES (?, ?)
-            ON CONFLICT(date) DO UPDATE SET data=excluded.data
-        ''', (date, data_json))
-        conn.commit()
+    with transaction() as conn:
+        conn.execute('DELETE FROM market_prices WHERE day = ?', (_day(date),))
+        _insert_market(conn, date, data)
 
 def read_market(date: str) -> dict | None:
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT data FROM market WHERE date = ?', (date,))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
\ No newline at end of file
+    cursor = connect().execute('''
+        SELECT ticker, close FROM market_prices JOIN tickers ON tickers.id = market_prices.ticker_id
+        WHERE day = ?
+    ''', (_day(date),))
+    return dict(cursor.fetchall()) or None
+
+def has_market(date: str) -> bool:
+    return connect().execute('SELECT 1 FROM market_prices WHERE day = ? LIMIT 1', (_day(date),)).fetchone() is not None
+
+def read_market_prices(date: str, tickers: list[str]) -> dict[str, float]:
+    """Look up closing prices for just these tickers, using the (day, ticker id) primary key"""
+    placeholders = ",".join("?" * len(tickers))
+    cursor = connect().execute(f'''
+        SELECT ticker, close FROM tickers JOIN market_prices ON market_prices.ticker_id = tickers.id
+        WHERE day = ? AND ticker IN ({placeholders})
+    ''', [_day(date), *tickers])
+    return dict(cursor.fetchall())
+
+def write_prices(prices: dict[str, float], fetched_at: float) -> None:
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO prices (symbol, price, fetched_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(symbol) DO UPDATE SET price=excluded.price, fetched_at=excluded.fetched_at
+        ''', [(symbol, price, fetched_at) for symbol, price in prices.items()])
+
+def clear_prices() -> None:
+    connect().execute('DELETE FROM prices')
+
+def read_prices(symbols: list[str]) -> dict[str, tuple[float, float]]:
+    """Return the cached (price, fetched_at) for each of the symbols that has one"""
+    placeholders = ",".join("?" * len(symbols))
+    cursor = connect().execute(
+        f'SELECT symbol, price, fetched_at FROM prices WHERE symbol IN ({placeholders})', symbols
+    )
+    return {symbol: (price, fetched_at) for symbol, price, fetched_at in cursor}
+
+def write_research_result(key: str, tool: str, result: dict, fetched_at: float) -> None:
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO research_cache (key, tool, result, fetched_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET result=excluded.result, fetched_at=excluded.fetched_at
+        ''', (key, tool, json.dumps(result), fetched_at))
+
+def read_research_result(key: str) -> tuple[dict, float] | None:
+    """Return the cached (result, fetched_at) for a research tool call, if there is one"""
+    row = connect().execute('SELECT result, fetched_at FROM research_cache WHERE key = ?', (key,)).fetchone()
+    return (json.loads(row[0]), row[1]) if row else None
+
+def prune_research_cache(max_age_seconds: float) -> int:
+    """Delete cached research results older than max_age_seconds; returns how many were deleted"""
+    with transaction() as conn:
+        return conn.execute(
+            'DELETE FROM research_cache WHERE fetched_at < ?', (time.time() - max_age_seconds,)
+        ).rowcount
+
+
+migrate()
@@ -0,0 +1,118 @@
+from pydantic import BaseModel, Field, computed_field
+from money import Cents, scale, to_dollars
+
+
+class Ledger(BaseModel):
+    """
+    Running aggregates over an account's append-only transaction history.
+    Each transaction updates them in O(1), so P&L never needs to re-walk the history.
+    Cost basis uses the average cost method: a sale releases cost in proportion to the shares sold.
+    Amounts are held in integer cents; they are dumped in dollars.
+    """
+
+    cost_basis_cents: dict[str, Cents] = Field(default={}, exclude=True)
+    realized_pnl_cents: Cents = Field(default=0, exclude=True)
+    net_invested_cents: Cents = Field(default=0, exclude=True)
+
+    @computed_field
+    @property
+    def cost_basis(self) -> dict[str, float]:
+        return {symbol: to_dollars(cost) for symbol, cost in self.cost_basis_cents.items()}
+
+    @computed_field
+    @property
+    def realized_pnl(self) -> float:
+        return to_dollars(self.realized_pnl_cents)
+
+    @computed_field
+    @property
+    def net_invested(self) -> float:
+        return to_dollars(self.net_invested_cents)
+
+    def record(self, symbol: str, quantity: int, price_cents: Cents, held: int) -> None:
+        """ Apply one transaction; held is the number of shares owned just before it. """
+        self.net_invested_cents += quantity * price_cents
+        cost = self.cost_basis_cents.get(symbol, 0)
+        if quantity > 0:
+            self.cost_basis_cents[symbol] = cost + quantity * price_cents
+            return
+        sold = -quantity
+        released = scale(cost, sold, held) if held else 0
+        self.realized_pnl_cents += sold * price_cents - released
+        if held > sold:
+            self.cost_basis_cents[symbol] = cost - released
+        else:
+            self.cost_basis_cents.pop(symbol, None)
+
+    def to_record(self) -> dict:
+        """ The aggregates in cents, as they are stored. """
+        return {
+            "cost_basis_cents": dict(self.cost_basis_cents),
+            "realized_pnl_cents": self.realized_pnl_cents,
+            "net_invested_cents": self.net_invested_cents,
+        }
+
+    def position_cost(self, symbol: str) -> Cents:
+        return self.cost_basis_cents.get(symbol, 0)
+
+    def average_price(self, symbol: str, held: int) -> float:
+        """ Average entry price in dollars, which needn't be a whole number of cents. """
+        return to_dollars(self.position_cost(symbol)) / held if held else 0.0
+
+    @classmethod
+    def replay(cls, transactions) -> tuple["Ledger", dict[str, int]]:
+        """
+        Rebuild the aggregates from scratch.
+
+        Args:
+            transactions: (symbol, quantity, price_cents) tuples in the order they were made
+
+        Returns:
+            The rebuilt ledger and the holdings implied by the history
+        """
+        ledger = cls()
+        holdings: dict[str, int] = {}
+        for symbol, quantity, price_cents in transactions:
+            held = holdings.get(symbol, 0)
+            ledger.record(symbol, quantity, price_cents, held)
+            if held + quantity:
+                holdings[symbol] = held + quantity
+            else:
+                holdings.pop(symbol, None)
+        return ledger, holdings
+
+
+def verify(name: str) -> list[str]:
+    """ Replay an account's ledger and list any differences from the stored aggregates, which must match to the cent. """
+    from database import read_account
+
+    account = read_account(name)
+    rebuilt, holdings = Ledger.replay(
+        (t["symbol"], t["quantity"], t["price_cents"]) for t in account["transactions"]
+    )
+    stored = Ledger(**account["ledger"])
+    problems = []
+    if holdings != account["holdings"]:
+        problems.append(f"holdings {account['holdings']} != replayed {holdings}")
+    for field in ("realized_pnl_cents", "net_invested_cents"):
+        if getattr(stored, field) != getattr(rebuilt, field):
+            problems.append(f"{field} {getattr(stored, field)} != replayed {getattr(rebuilt, field)}")
+    for symbol in stored.cost_basis_cents.keys() | rebuilt.cost_basis_cents.keys():
+        if stored.position_cost(symbol) != rebuilt.position_cost(symbol):
+            problems.append(
+                f"cost basis of {symbol} {stored.position_cost(symbol)} != replayed {rebuilt.position_cost(symbol)}"
+            )
+    return problems
+
+
+if __name__ == "__main__":
+    import sys
+    from database import read_account_names
+
+    names = sys.argv[1:] or read_account_names()
+    failures = 0
+    for name in names:
+        problems = verify(name)
+        failures += bool(problems)
+        print(f"{name}: {'OK' if not problems else '; '.join(problems)}")
+    sys.exit(1 if failures else 0)
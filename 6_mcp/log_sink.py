@@ -0,0 +1,115 @@
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Callable
+
+
+class LogSink:
+    """
+    Background writer that takes rows off a bounded queue and group-commits them in batches.
+    A batch is written once it reaches batch_size rows or flush_interval seconds after its first row,
+    so callers never wait on SQLite. When the queue is full, submit() waits up to put_timeout
+    for space (backpressure) and then drops the row, counting it in stats["dropped"].
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[list[tuple]], None],
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        put_timeout: float = 0.05,
+    ):
+        self.writer = writer
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.stats = {"submitted": 0, "written": 0, "dropped": 0, "batches": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: tuple) -> bool:
+        """ Queue a row for writing; returns False if it had to be dropped. """
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["submitted"] += 1
+        return True
+
+    def flush(self, timeout: float | None = 5.0) -> bool:
+        """ Block until every row submitted so far has been written. """
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def shutdown(self, timeout: float | None = 5.0) -> None:
+        """ Write everything still queued and stop the background thread. """
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self.flush(timeout)
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            item = first
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch: list[tuple]) -> None:
+        try:
+            self.writer(batch)
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.stats["dropped"] += len(batch)
+            print(f"Log sink failed to write {len(batch)} rows: {e}", file=sys.stderr)
+            return
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from typing import AsyncIterator
+
+
+class LogChannel:
+    """
+    In-process pub/sub for log entries, so the dashboard is pushed new rows instead of polling.
+
+    One tailer thread (started when the first subscriber arrives) follows the logs table by id
+    and fans new rows out to subscribers by trader name. It only queries when something changed:
+    commits in this process wake it through notify(), and commits from other processes
+    (the trading floor, the accounts server) are spotted through SQLite's data_version,
+    which is a pragma read rather than a table query.
+    """
+
+    def __init__(self, poll_interval: float = 0.25):
+        self.poll_interval = poll_interval
+        self._subscribers: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_id = 0
+
+    def notify(self) -> None:
+        """ Called after new log rows are committed in this process. """
+        self._wake.set()
+
+    async def subscribe(self, name: str, backlog: int = 13) -> AsyncIterator[list[tuple]]:
+        """
+        Yield the most recent `backlog` entries for a trader, then each batch of new ones as it arrives.
+        Rows are (id, datetime, type, message) tuples.
+        """
+        from database import read_log_since, last_log_id
+
+        name = name.lower()
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(name, set()).add(subscriber)
+            if self._thread is None:
+                self._last_id = last_log_id()
+                self._thread = threading.Thread(target=self._run, name="log-channel", daemon=True)
+                self._thread.start()
+        try:
+            recent = read_log_since(name, 0, limit=backlog)
+            last_id = recent[-1][0] if recent else 0
+            yield recent
+            while True:
+                rows = [row for row in await subscriber[1].get() if row[0] > last_id]
+                if rows:
+                    last_id = rows[-1][0]
+                    yield rows
+        finally:
+            with self._lock:
+                self._subscribers[name].discard(subscriber)
+
+    def _publish(self, rows: list[tuple]) -> None:
+        by_name: dict[str, list[tuple]] = {}
+        for id, name, datetime, type, message in rows:
+            by_name.setdefault(name, []).append((id, datetime, type, message))
+        with self._lock:
+            targets = [(self._subscribers.get(name, ()), delta) for name, delta in by_name.items()]
+            for subscribers, delta in targets:
+                for loop, queue in subscribers:
+                    try:
+                        loop.call_soon_threadsafe(queue.put_nowait, delta)
+                    except RuntimeError:
+                        pass  # the subscriber's event loop has closed
+
+    def _run(self) -> None:
+        from database import connect, read_logs_after
+
+        last_id = self._last_id
+        version = connect().execute("PRAGMA data_version").fetchone()[0]
+        while True:
+            woken = self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            current = connect().execute("PRAGMA data_version").fetchone()[0]
+            if not woken and current == version:
+                continue
+            version = current
+            rows = read_logs_after(last_id)
+            while rows:
+                last_id = rows[-1][0]
+                self._publish(rows)
+                rows = read_logs_after(last_id)
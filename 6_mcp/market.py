@@ -1,9 +1,12 @@
 from polygon import RESTClient
 from dotenv import load_dotenv
 import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-import random
-from database import write_market, read_market
+from database import write_market, has_market, read_market_prices, write_prices, read_prices, clear_prices
+from market_sim import simulator
 from functools import lru_cache
 from datetime import timezone
 
@@ -15,16 +18,26 @@ polygon_plan = os.getenv("POLYGON_PLAN")
 is_paid_polygon = polygon_plan == "paid"
 is_realtime_polygon = polygon_plan == "realtime"
 
+# Prices younger than PRICE_TTL_SECONDS are served from cache; for a further PRICE_STALE_SECONDS
+# the cached price is still served while a refresh runs in the background
+PRICE_TTL_SECONDS = float(os.getenv("PRICE_TTL_SECONDS", "60"))
+PRICE_STALE_SECONDS = float(os.getenv("PRICE_STALE_SECONDS", "300"))
+
+
+@lru_cache(maxsize=1)
+def get_polygon_client() -> RESTClient:
+    return RESTClient(polygon_api_key)
+
 
 def is_market_open() -> bool:
-    client = RESTClient(polygon_api_key)
+    client = get_polygon_client()
     market_status = client.get_market_status()
     return market_status.market == "open"
 
 
 def get_all_share_prices_polygon_eod() -> dict[str, float]:
     """With much thanks to student Reema R. for fixing the timezone issue with this!"""
-    client = RESTClient(polygon_api_key)
+    client = get_polygon_client()
 
     probe = client.get_previous_close_agg("SPY")[0]
     last_close = datetime.fromtimestamp(probe.timestamp / 1000, tz=timezone.utc).date()
@@ -34,37 +47,138 @@ def get_all_share_prices_polygon_eod() -> dict[str, float]:
 
 
 @lru_cache(maxsize=2)
-def get_market_for_prior_date(today):
-    market_data = read_market(today)
-    if not market_data:
-        market_data = get_all_share_prices_polygon_eod()
-        write_market(today, market_data)
-    return market_data
+def ensure_market_for_prior_date(today) -> str:
+    if not has_market(today):
+        write_market(today, get_all_share_prices_polygon_eod())
+    return today
 
 
-def get_share_price_polygon_eod(symbol) -> float:
-    today = datetime.now().date().strftime("%Y-%m-%d")
-    market_data = get_market_for_prior_date(today)
-    return market_data.get(symbol, 0.0)
+def get_share_prices_polygon_eod(symbols: list[str]) -> dict[str, float]:
+    today = ensure_market_for_prior_date(datetime.now().date().strftime("%Y-%m-%d"))
+    market_data = read_market_prices(today, symbols)
+    return {symbol: market_data.get(symbol, 0.0) for symbol in symbols}
 
 
-def get_share_price_polygon_min(symbol) -> float:
-    client = RESTClient(polygon_api_key)
-    result = client.get_snapshot_ticker("stocks", symbol)
-    return result.min.close or result.prev_day.close
+def get_share_prices_polygon_min(symbols: list[str]) -> dict[str, float]:
+    """One snapshot request for all the symbols, rather than one per symbol"""
+    results = get_polygon_client().get_snapshot_all("stocks", tickers=symbols)
+    prices = {result.ticker: result.min.close or result.prev_day.close for result in results}
+    return {symbol: prices.get(symbol, 0.0) for symbol in symbols}
 
 
-def get_share_price_polygon(symbol) -> float:
+def get_share_prices_polygon(symbols: list[str]) -> dict[str, float]:
     if is_paid_polygon:
-        return get_share_price_polygon_min(symbol)
+        return get_share_prices_polygon_min(symbols)
     else:
-        return get_share_price_polygon_eod(symbol)
+        return get_share_prices_polygon_eod(symbols)
 
 
-def get_share_price(symbol) -> float:
+def fetch_share_prices(symbols: list[str]) -> dict[str, float]:
+    """Go upstream for the latest prices, with a single call for the whole batch"""
     if polygon_api_key:
         try:
-            return get_share_price_polygon(symbol)
+            return get_share_prices_polygon(symbols)
         except Exception as e:
-            print(f"Was not able to use the polygon API due to {e}; using a random number")
-    return float(random.randint(1, 100))
+            print(f"Was not able to use the polygon API due to {e}; using simulated prices")
+    return simulator.quote(symbols)
+
+
+class PriceCache:
+    """
+    Two-tier price cache: a dict in memory, backed by the prices table so that the
+    accounts server, market server and dashboard processes share what any of them fetched.
+    Concurrent lookups of the same symbol share one upstream call, and a cache miss for
+    several symbols is one batch call.
+    """
+
+    def __init__(self, fetch, ttl: float = PRICE_TTL_SECONDS, stale: float = PRICE_STALE_SECONDS):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale = stale
+        self.stats = {"memory_hits": 0, "db_hits": 0, "stale_hits": 0, "fetches": 0, "symbols_fetched": 0}
+        self._memory: dict[str, tuple[float, float]] = {}
+        self._in_flight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="price-refresh")
+
+    def get_many(self, symbols: list[str]) -> dict[str, float]:
+        now = time.time()
+        prices, missing, stale = {}, [], []
+        for symbol in dict.fromkeys(symbols):
+            cached = self._memory.get(symbol)
+            if cached and now - cached[1] < self.ttl:
+                prices[symbol] = cached[0]
+                self.stats["memory_hits"] += 1
+            else:
+                missing.append(symbol)
+        if missing:
+            stored = read_prices(missing)
+            self._memory.update(stored)
+            still_missing = []
+            for symbol in missing:
+                cached = stored.get(symbol)
+                age = now - cached[1] if cached else None
+                if cached and age < self.ttl:
+                    prices[symbol] = cached[0]
+                    self.stats["db_hits"] += 1
+                elif cached and age < self.ttl + self.stale:
+                    prices[symbol] = cached[0]
+                    stale.append(symbol)
+                    self.stats["stale_hits"] += 1
+                else:
+                    still_missing.append(symbol)
+            if still_missing:
+                prices.update(self._load(still_missing))
+        if stale:
+            self._refresher.submit(self._load, stale)
+        return prices
+
+    def clear(self) -> None:
+        """Forget every cached price, in memory and in the prices table, so the next lookups go upstream"""
+        self._memory.clear()
+        clear_prices()
+
+    def _load(self, symbols: list[str]) -> dict[str, float]:
+        """Fetch the symbols nobody else is already fetching, then wait for the rest"""
+        with self._lock:
+            waiting = {symbol: self._in_flight[symbol] for symbol in symbols if symbol in self._in_flight}
+            mine = [symbol for symbol in symbols if symbol not in waiting]
+            futures = {symbol: Future() for symbol in mine}
+            self._in_flight.update(futures)
+        prices = {}
+        if mine:
+            try:
+                fetched = self.fetch(mine)
+                self.stats["fetches"] += 1
+                self.stats["symbols_fetched"] += len(mine)
+                fetched_at = time.time()
+                self._memory.update({symbol: (price, fetched_at) for symbol, price in fetched.items()})
+                write_prices(fetched, fetched_at)
+                prices.update(fetched)
+                for symbol, future in futures.items():
+                    future.set_result(fetched.get(symbol, 0.0))
+            except Exception as e:
+                for future in futures.values():
+                    future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for symbol in mine:
+                        self._in_flight.pop(symbol, None)
+        for symbol, future in waiting.items():
+            prices[symbol] = future.result()
+        return prices
+
+
+price_cache = PriceCache(fetch_share_prices)
+
+
+def get_share_prices(symbols: list[str]) -> dict[str, float]:
+    """Latest prices for several symbols, costing at most one upstream call"""
+    if not symbols:
+        return {}
+    return price_cache.get_many(list(symbols))
+
+
+def get_share_price(symbol) -> float:
+    return get_share_prices([symbol])[symbol]
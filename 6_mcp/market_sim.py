@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+SIMULATOR_SEED = int(os.getenv("SIMULATOR_SEED", "42"))
+SIMULATOR_EPOCH = os.getenv("SIMULATOR_EPOCH", "2025-01-01")
+SIMULATOR_STEP_SECONDS = int(os.getenv("SIMULATOR_STEP_SECONDS", "300"))
+
+SECONDS_PER_DAY = 24 * 60 * 60
+SECONDS_PER_YEAR = 365 * SECONDS_PER_DAY
+
+DEFAULT_UNIVERSE = [
+    "SPY", "QQQ", "DIA", "IWM", "AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META",
+    "TSLA", "BRK.B", "JPM", "V", "XOM", "JNJ", "WMT", "KO", "PFE", "DIS",
+    "TLT", "GLD", "IBIT", "ETHA", "GBTC", "ARKK", "COIN", "MSTR", "AMD", "NFLX",
+]
+
+
+class MarketSimulator:
+    """
+    Deterministic, offline stand-in for Polygon prices.
+
+    Every symbol follows a geometric Brownian motion driven by a shared market factor plus its
+    own noise, stepping forward every step_seconds from a fixed epoch. Each random path is built
+    from seeded daily increments, with a Brownian bridge filling in the steps within a day, so a
+    quote is a pure function of the seed, the symbol and the time: it doesn't depend on which
+    symbols were asked for first, or by which process, and a quote costs O(days + steps per day).
+    """
+
+    def __init__(
+        self,
+        seed: int = SIMULATOR_SEED,
+        epoch: str = SIMULATOR_EPOCH,
+        step_seconds: int = SIMULATOR_STEP_SECONDS,
+        drift: float = 0.07,
+        volatility: float = 0.30,
+        correlation: float = 0.4,
+        clock=time.time,
+    ):
+        if SECONDS_PER_DAY % step_seconds:
+            raise ValueError("step_seconds must divide a day evenly")
+        self.seed = seed
+        self.epoch = datetime.fromisoformat(epoch).replace(tzinfo=timezone.utc).timestamp()
+        self.step_seconds = step_seconds
+        self.steps_per_day = SECONDS_PER_DAY // step_seconds
+        self.clock = clock
+        dt = step_seconds / SECONDS_PER_YEAR
+        self._step_drift = (drift - volatility**2 / 2) * dt
+        self._market_scale = volatility * np.sqrt(dt) * np.sqrt(correlation)
+        self._own_scale = volatility * np.sqrt(dt) * np.sqrt(1 - correlation)
+        self._lock = threading.Lock()
+        self._days: dict[tuple[int, int], tuple[float, float, np.ndarray]] = {}
+        self._initial: dict[str, float] = {}
+
+    def _key(self, symbol: str | None) -> int:
+        return 0 if symbol is None else zlib.crc32(symbol.encode()) + 1
+
+    def _day(self, key: int, day: int) -> tuple[float, float, np.ndarray]:
+        """ The path's value at the start and end of a day, and the bridge between them. """
+        cached = self._days.get((key, day))
+        if cached is None:
+            daily = np.random.default_rng([self.seed, key, 0]).standard_normal(day + 1) * np.sqrt(self.steps_per_day)
+            start = daily[:day].sum()
+            steps = np.cumsum(np.random.default_rng([self.seed, key, 1, day]).standard_normal(self.steps_per_day))
+            bridge = np.concatenate([[0.0], steps[:-1] - np.arange(1, self.steps_per_day) / self.steps_per_day * steps[-1]])
+            cached = (start, start + daily[day], bridge)
+            if len(self._days) > 50_000:
+                self._days.clear()
+            self._days[(key, day)] = cached
+        return cached
+
+    def _walk(self, symbol: str | None, step: int) -> float:
+        day, within = divmod(step, self.steps_per_day)
+        start, end, bridge = self._day(self._key(symbol), day)
+        return start + within / self.steps_per_day * (end - start) + bridge[within]
+
+    def _initial_log_price(self, symbol: str) -> float:
+        if symbol not in self._initial:
+            rng = np.random.default_rng([self.seed, self._key(symbol), 2])
+            self._initial[symbol] = np.log(rng.uniform(10, 500))
+        return self._initial[symbol]
+
+    def _step_at(self, timestamp: float) -> int:
+        return max(0, int((timestamp - self.epoch) // self.step_seconds))
+
+    def prices_at(self, symbols: list[str], step: int) -> dict[str, float]:
+        with self._lock:
+            initial = np.array([self._initial_log_price(symbol) for symbol in symbols])
+            own = np.array([self._walk(symbol, step) for symbol in symbols])
+            market = self._walk(None, step)
+        log_prices = initial + self._step_drift * step + self._market_scale * market + self._own_scale * own
+        return dict(zip(symbols, np.round(np.exp(log_prices), 2).tolist()))
+
+    def quote(self, symbols: list[str]) -> dict[str, float]:
+        """ Current prices for the symbols, according to the simulator's clock. """
+        return self.prices_at(symbols, self._step_at(self.clock()))
+
+    def grouped_daily(self, day: date | str, symbols: list[str] | None = None) -> dict[str, float]:
+        """ Closing prices for a day, shaped like get_all_share_prices_polygon_eod(). """
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        close = datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        step = min(self._step_at(close.timestamp()) - 1, self._step_at(self.clock()))
+        return self.prices_at(symbols or DEFAULT_UNIVERSE, max(step, 0))
+
+
+simulator = MarketSimulator()
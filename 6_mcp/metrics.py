@@ -0,0 +1,149 @@
+"""
+Where a trader run spends its time. MetricsTracer records every finished span - its wall time,
+the tokens used by model calls and which MCP server served each tool call - into the span_metrics
+table, and span_report() summarizes them as p50/p95/p99 latencies per span type, model and tool.
+
+    uv run metrics.py --hours 24
+    uv run metrics.py --hours 1 --trader warren
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from agents import Span, Trace, TracingProcessor
+
+from database import metrics_sink, read_span_metrics, write_span_metric
+from tracers import trader_name
+
+REPORT_COLUMNS = [
+    "Type", "Label", "Server", "Count", "p50 ms", "p95 ms", "p99 ms",
+    "Total s", "Input tokens", "Output tokens", "Errors",
+]
+
+
+def _timestamp(iso: str) -> datetime:
+    return datetime.fromisoformat(iso).astimezone(timezone.utc)
+
+
+def _usage(span_data) -> tuple[int | None, int | None]:
+    """ Input and output tokens of a generation or response span; None for other spans. """
+    usage = getattr(span_data, "usage", None)
+    if usage is None and getattr(span_data, "response", None) is not None:
+        usage = getattr(span_data.response, "usage", None)
+    if usage is None:
+        return None, None
+    if isinstance(usage, dict):
+        return usage.get("input_tokens", usage.get("prompt_tokens")), usage.get("output_tokens", usage.get("completion_tokens"))
+    return getattr(usage, "input_tokens", None), getattr(usage, "output_tokens", None)
+
+
+def _label(span_data) -> tuple[str, str | None]:
+    """ What a span is about - the model, tool or agent - and the MCP server behind it, if any. """
+    if span_data.type == "generation":
+        return span_data.model or "unknown", None
+    if span_data.type == "response":
+        return getattr(span_data.response, "model", None) or "unknown", None
+    if span_data.type == "function":
+        return span_data.name, (getattr(span_data, "mcp_data", None) or {}).get("server")
+    if span_data.type == "mcp_tools":
+        return "list_tools", span_data.server
+    return getattr(span_data, "name", None) or span_data.type, None
+
+
+class MetricsTracer(TracingProcessor):
+    """ Records the duration and token usage of each trader's spans; other traces are ignored. """
+
+    def __init__(self):
+        self._trace_starts: dict[str, float] = {}
+
+    def on_trace_start(self, trace: Trace) -> None:
+        if trader_name(trace.trace_id):
+            self._trace_starts[trace.trace_id] = time.perf_counter()
+
+    def on_trace_end(self, trace: Trace) -> None:
+        started = self._trace_starts.pop(trace.trace_id, None)
+        if started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        began = datetime.now(timezone.utc) - timedelta(milliseconds=duration_ms)
+        label = trace.name.split("-", 1)[-1]
+        write_span_metric(trader_name(trace.trace_id), "trace", label, None, began.strftime("%Y-%m-%d %H:%M:%S"), duration_ms)
+
+    def on_span_start(self, span: Span) -> None:
+        pass
+
+    def on_span_end(self, span: Span) -> None:
+        name = trader_name(span.trace_id)
+        if not name or not span.span_data or not span.started_at or not span.ended_at:
+            return
+        started, ended = _timestamp(span.started_at), _timestamp(span.ended_at)
+        label, server = _label(span.span_data)
+        input_tokens, output_tokens = _usage(span.span_data)
+        write_span_metric(
+            name,
+            span.span_data.type,
+            label,
+            server,
+            started.strftime("%Y-%m-%d %H:%M:%S"),
+            (ended - started).total_seconds() * 1000,
+            input_tokens,
+            output_tokens,
+            span.error is not None,
+        )
+
+    def force_flush(self) -> None:
+        metrics_sink.flush()
+
+    def shutdown(self) -> None:
+        metrics_sink.shutdown()
+
+
+def span_report(hours: float = 24, trader: str | None = None) -> pd.DataFrame:
+    """
+    Latency percentiles, total time and tokens per span type, label and server over the last
+    `hours`, the spans that took the most time in total first.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+    rows = read_span_metrics(since, trader)
+    if not rows:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    df = pd.DataFrame(
+        rows,
+        columns=["name", "type", "label", "server", "duration_ms", "input_tokens", "output_tokens", "error"],
+    )
+    df["server"] = df["server"].fillna("")
+    grouped = df.groupby(["type", "label", "server"])
+    durations = grouped["duration_ms"]
+    report = pd.DataFrame({
+        "Count": grouped.size(),
+        "p50 ms": durations.quantile(0.50),
+        "p95 ms": durations.quantile(0.95),
+        "p99 ms": durations.quantile(0.99),
+        "Total s": durations.sum() / 1000,
+        "Input tokens": grouped["input_tokens"].sum(min_count=1),
+        "Output tokens": grouped["output_tokens"].sum(min_count=1),
+        "Errors": grouped["error"].sum(),
+    })
+    report = report.sort_values("Total s", ascending=False).reset_index()
+    report = report.rename(columns={"type": "Type", "label": "Label", "server": "Server"})
+    report = report.astype({"Input tokens": "Int64", "Output tokens": "Int64"})
+    return report.round({"p50 ms": 0, "p95 ms": 0, "p99 ms": 0, "Total s": 1})[REPORT_COLUMNS]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=24, help="How far back to look")
+    parser.add_argument("--trader", help="Only this trader's spans")
+    args = parser.parse_args()
+
+    report = span_report(args.hours, args.trader)
+    if report.empty:
+        print("No span metrics recorded in that period")
+    else:
+        print(report.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Money is held as integer cents. Adding and subtracting cents is exact, so balances and P&L
+don't drift over thousands of trades the way binary floats do. Amounts are only converted
+to dollars for display and for the agents.
+"""
+
+Cents = int
+
+CENTS_PER_DOLLAR = 100
+BASIS_POINTS = 10_000
+
+
+def to_cents(dollars: float) -> Cents:
+    """ Nearest whole cent; exact for any amount written with two decimal places. """
+    return round(dollars * CENTS_PER_DOLLAR)
+
+
+def to_dollars(cents: Cents) -> float:
+    return cents / CENTS_PER_DOLLAR
+
+
+def scale(cents: Cents, numerator: int, denominator: int) -> Cents:
+    """ cents * numerator / denominator, rounded half up, in integer arithmetic. """
+    quotient, remainder = divmod(cents * numerator, denominator)
+    return quotient + (2 * remainder >= denominator)
+
+
+def add_basis_points(cents: Cents, basis_points: int) -> Cents:
+    """ Mark an amount up (or down, for negative basis_points) by a number of hundredths of a percent. """
+    return scale(cents, BASIS_POINTS + basis_points, BASIS_POINTS)
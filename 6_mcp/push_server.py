@@ -1,14 +1,14 @@
-import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
-import requests
 from pydantic import BaseModel, Field
 from mcp.server.fastmcp import FastMCP
+from shutdown import on_terminate
 
-load_dotenv(override=True)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.api.notifier import notifier, push_notification  # noqa: E402
 
-pushover_user = os.getenv("PUSHOVER_USER")
-pushover_token = os.getenv("PUSHOVER_TOKEN")
-pushover_url = "https://api.pushover.net/1/messages.json"
+load_dotenv(override=True)
 
 
 mcp = FastMCP("push_server")
@@ -21,11 +21,13 @@ class PushModelArgs(BaseModel):
 @mcp.tool()
 def push(args: PushModelArgs):
     """Send a push notification with this brief message"""
-    print(f"Push: {args.message}")
-    payload = {"user": pushover_user, "token": pushover_token, "message": args.message}
-    requests.post(pushover_url, data=payload)
+    print(f"Push: {args.message}", file=sys.stderr)
+    # Delivered in the background, so the agent's turn doesn't wait on Pushover
+    push_notification(args.message)
     return "Push notification sent"
 
 
 if __name__ == "__main__":
+    # Deliver any digest still being gathered before the server is stopped
+    on_terminate(notifier.close)
     mcp.run(transport="stdio")
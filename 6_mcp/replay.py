@@ -0,0 +1,476 @@
+"""
+Record a real trading cycle and replay it offline.
+
+Recording runs one cycle of the configured traders with live models and MCP servers and writes
+every model response and tool result to a cassette, a JSON lines file. Replaying runs the same
+traders from the cassette: model calls and the external servers (push, fetch, search, memory)
+are answered from it, while our own accounts and market servers run in-process on the local
+database. So a replay exercises accounts.py, database.py and traders.py as a live cycle would,
+with no network, no API keys and no server processes. Each replay starts from freshly reset
+accounts in a scratch database, so it leaves the live accounts alone and always starts the same.
+Prices come from the market simulator with its clock pinned to the time the cycle was recorded,
+and the price cache is emptied before each cycle, so every replay sees the same prices.
+
+    uv run replay.py record cycle.jsonl
+    uv run replay.py replay cycle.jsonl
+    uv run benchmarks/cycle.py cycle.jsonl
+
+Model responses are matched by trader, agent (its instructions) and conversation (its first user
+message), in the order they were recorded; tool results by trader, server, tool and arguments.
+Timestamps are masked before matching, since the instructions include the current time.
+A conversation whose first message differs on replay - the trader's own, which embeds its
+account summary - falls back to the only conversation recorded for that trader and agent.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable
+
+# A replay calls no models, but importing traders builds the providers' clients, which want a key;
+# a real one from the environment or .env still wins
+os.environ.setdefault("OPENAI_API_KEY", "replay")
+
+from agents import Model, ModelResponse, add_trace_processor, set_trace_processors  # noqa: E402
+from agents.items import TResponseOutputItem  # noqa: E402
+from agents.mcp import MCPServer  # noqa: E402
+from agents.tracing import get_current_trace  # noqa: E402
+from agents.usage import Usage  # noqa: E402
+from mcp.server.fastmcp import FastMCP  # noqa: E402
+from mcp.server.fastmcp.exceptions import ToolError  # noqa: E402
+from mcp.types import CallToolResult, ListPromptsResult, TextContent  # noqa: E402
+from mcp.types import Tool as MCPTool  # noqa: E402
+from openai.types.responses import Response, ResponseCompletedEvent  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+import accounts_server  # noqa: E402
+import database  # noqa: E402
+import market  # noqa: E402
+import market_server  # noqa: E402
+import market_sim  # noqa: E402
+import traders as traders_module  # noqa: E402
+from accounts import Account  # noqa: E402
+from metrics import MetricsTracer  # noqa: E402
+from scheduler import TraderScheduler  # noqa: E402
+from tracers import LogTracer, trader_name  # noqa: E402
+from trader_config import TraderConfig, load_trader_configs  # noqa: E402
+from traders import Trader  # noqa: E402
+from trading_floor import MCPFleet, create_traders  # noqa: E402
+
+DATETIME = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?")
+USAGE_FIELDS = ["requests", "input_tokens", "output_tokens", "total_tokens"]
+
+# Our own servers, which a replay runs in-process instead of answering from the cassette
+LOCAL_SERVERS: dict[str, FastMCP] = {
+    "uv run accounts_server.py": accounts_server.mcp,
+    "uv run market_server.py": market_server.mcp,
+}
+
+_output_items = TypeAdapter(list[TResponseOutputItem])
+
+
+class ReplayMismatch(KeyError):
+    """Raised when a replay asks for a response or tool result the cassette didn't record"""
+
+
+def server_label(params: dict) -> str:
+    return " ".join([params["command"], *params.get("args", [])])
+
+
+def _digest(*parts: str) -> str:
+    text = "\x00".join(DATETIME.sub("<datetime>", part) for part in parts)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def _current_trader() -> str:
+    """ The trader whose trace is running, from the registry that make_trace_id() fills in. """
+    trace = get_current_trace()
+    return (trace and trader_name(trace.trace_id)) or ""
+
+
+def _first_user_message(input) -> str:
+    if isinstance(input, str):
+        return input
+    for item in input:
+        if isinstance(item, dict) and item.get("role") == "user":
+            content = item.get("content")
+            return content if isinstance(content, str) else json.dumps(content, sort_keys=True)
+    return ""
+
+
+def _conversation(args: tuple, kwargs: dict) -> tuple[str, str, str]:
+    """ (trader, agent, conversation) of a Model.get_response() call. """
+    instructions = kwargs.get("system_instructions", args[0] if args else None) or ""
+    input = kwargs.get("input", args[1] if len(args) > 1 else "")
+    return _current_trader(), _digest(instructions), _digest(instructions, _first_user_message(input))
+
+
+def _dump_response(response: ModelResponse) -> dict:
+    return {
+        "output": [item.model_dump(mode="json") for item in response.output],
+        "usage": {field: getattr(response.usage, field) for field in USAGE_FIELDS},
+        "response_id": response.response_id,
+    }
+
+
+def _load_response(data: dict) -> ModelResponse:
+    return ModelResponse(
+        output=_output_items.validate_python(data["output"]),
+        usage=Usage(**data["usage"]),
+        response_id=data["response_id"],
+    )
+
+
+class Cassette:
+    """ The model responses and tool results of a recorded cycle, and how far a replay has read them. """
+
+    def __init__(self, traders: list[dict] | None = None, started_at: float | None = None):
+        self.traders = traders or []
+        self.started_at = started_at
+        self.responses: dict[tuple, list[dict]] = defaultdict(list)
+        self.tools: dict[str, list[dict]] = {}
+        self.calls: dict[tuple, list[dict]] = defaultdict(list)
+        self.rewind()
+
+    def rewind(self) -> None:
+        """ Start replaying from the beginning again. """
+        self._positions = defaultdict(int)
+        self.stats = {"model_calls": 0, "tool_calls": 0, "misses": 0}
+
+    def add_response(self, trader: str, agent: str, conversation: str, response: dict) -> None:
+        self.responses[(trader, agent, conversation)].append(response)
+
+    def add_tools(self, server: str, tools: list[dict]) -> None:
+        self.tools[server] = tools
+
+    def add_call(self, trader: str, server: str, tool: str, arguments: dict | None, result: dict) -> None:
+        self.calls[(trader, server, tool, _digest(json.dumps(arguments, sort_keys=True)))].append(result)
+
+    def next_response(self, trader: str, agent: str, conversation: str) -> dict:
+        key = (trader, agent, conversation)
+        if key not in self.responses:
+            candidates = [recorded for recorded in self.responses if recorded[:2] == (trader, agent)]
+            if len(candidates) == 1:
+                key = candidates[0]
+        self.stats["model_calls"] += 1
+        return self._next(self.responses, key)
+
+    def next_call(self, trader: str, server: str, tool: str, arguments: dict | None) -> dict:
+        self.stats["tool_calls"] += 1
+        return self._next(self.calls, (trader, server, tool, _digest(json.dumps(arguments, sort_keys=True))))
+
+    def _next(self, recorded: dict[tuple, list[dict]], key: tuple) -> dict:
+        position = self._positions[key]
+        if position >= len(recorded.get(key, [])):
+            self.stats["misses"] += 1
+            raise ReplayMismatch(f"Nothing more was recorded for {key}")
+        self._positions[key] = position + 1
+        return recorded[key][position]
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"kind": "traders", "traders": self.traders, "started_at": self.started_at}) + "\n")
+            for server, tools in self.tools.items():
+                f.write(json.dumps({"kind": "tools", "server": server, "tools": tools}) + "\n")
+            for (trader, agent, conversation), responses in self.responses.items():
+                for response in responses:
+                    row = {"kind": "response", "trader": trader, "agent": agent, "conversation": conversation}
+                    f.write(json.dumps(row | {"response": response}) + "\n")
+            for key, results in self.calls.items():
+                for result in results:
+                    f.write(json.dumps({"kind": "call", "key": list(key), "result": result}) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        cassette = cls()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                if row["kind"] == "traders":
+                    cassette.traders = row["traders"]
+                    cassette.started_at = row.get("started_at")
+                elif row["kind"] == "tools":
+                    cassette.tools[row["server"]] = row["tools"]
+                elif row["kind"] == "response":
+                    cassette.responses[(row["trader"], row["agent"], row["conversation"])].append(row["response"])
+                elif row["kind"] == "call":
+                    cassette.calls[tuple(row["key"])].append(row["result"])
+        return cassette
+
+
+class RecordingModel(Model):
+    """ Passes calls to the real model and writes each response to the cassette. """
+
+    def __init__(self, model: Model, cassette: Cassette):
+        self.model = model
+        self.cassette = cassette
+
+    async def get_response(self, *args, **kwargs):
+        conversation = _conversation(args, kwargs)
+        response = await self.model.get_response(*args, **kwargs)
+        self.cassette.add_response(*conversation, _dump_response(response))
+        return response
+
+    async def stream_response(self, *args, **kwargs):
+        async for event in self.model.stream_response(*args, **kwargs):
+            yield event
+
+
+class ReplayModel(Model):
+    """ Answers each call with the response recorded for the same conversation. """
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    async def get_response(self, *args, **kwargs):
+        return _load_response(self.cassette.next_response(*_conversation(args, kwargs)))
+
+    async def stream_response(self, *args, **kwargs):
+        """ The recorded response, as the one event that completes the stream. """
+        response = await self.get_response(*args, **kwargs)
+        yield ResponseCompletedEvent.model_construct(
+            type="response.completed",
+            sequence_number=0,
+            response=Response.model_construct(id=response.response_id, output=response.output, usage=None),
+        )
+
+
+class RecordingMCPServer(MCPServer):
+    """ A live MCP server whose tool list and tool results are written to the cassette. """
+
+    def __init__(self, server: MCPServer, label: str, cassette: Cassette):
+        super().__init__()
+        self.server = server
+        self.label = label
+        self.cassette = cassette
+
+    @property
+    def name(self) -> str:
+        return self.server.name
+
+    @property
+    def session(self):
+        return self.server.session
+
+    async def connect(self):
+        await self.server.connect()
+
+    async def cleanup(self):
+        await self.server.cleanup()
+
+    async def list_tools(self, *args, **kwargs):
+        tools = await self.server.list_tools(*args, **kwargs)
+        self.cassette.add_tools(self.label, [tool.model_dump(mode="json") for tool in tools])
+        return tools
+
+    async def call_tool(self, tool_name: str, arguments: dict | None, *args, **kwargs):
+        trader = _current_trader()
+        try:
+            result = await self.server.call_tool(tool_name, arguments, *args, **kwargs)
+        except Exception as e:
+            self.cassette.add_call(trader, self.label, tool_name, arguments, {"error": str(e)})
+            raise
+        self.cassette.add_call(trader, self.label, tool_name, arguments, result.model_dump(mode="json"))
+        return result
+
+    async def list_prompts(self, *args, **kwargs):
+        return await self.server.list_prompts(*args, **kwargs)
+
+    async def get_prompt(self, *args, **kwargs):
+        return await self.server.get_prompt(*args, **kwargs)
+
+
+class ReplayMCPServer(MCPServer):
+    """ Stands in for an external MCP server, answering from the cassette. """
+
+    def __init__(self, label: str, cassette: Cassette):
+        super().__init__()
+        self.label = label
+        self.cassette = cassette
+
+    @property
+    def name(self) -> str:
+        return self.label
+
+    async def connect(self):
+        pass
+
+    async def cleanup(self):
+        pass
+
+    async def list_tools(self, *args, **kwargs):
+        return [MCPTool.model_validate(tool) for tool in self.cassette.tools.get(self.label, [])]
+
+    async def call_tool(self, tool_name: str, arguments: dict | None, *args, **kwargs):
+        result = self.cassette.next_call(_current_trader(), self.label, tool_name, arguments)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return CallToolResult.model_validate(result)
+
+    async def list_prompts(self, *args, **kwargs):
+        return ListPromptsResult(prompts=[])
+
+    async def get_prompt(self, name: str, *args, **kwargs):
+        raise ReplayMismatch(f"Prompts aren't recorded: {name}")
+
+
+class LocalMCPServer(MCPServer):
+    """ One of our own FastMCP servers, called in-process instead of over stdio. """
+
+    def __init__(self, server: FastMCP):
+        super().__init__()
+        self.server = server
+
+    @property
+    def name(self) -> str:
+        return self.server.name
+
+    async def connect(self):
+        pass
+
+    async def cleanup(self):
+        pass
+
+    async def list_tools(self, *args, **kwargs):
+        return await self.server.list_tools()
+
+    async def call_tool(self, tool_name: str, arguments: dict | None, *args, **kwargs):
+        try:
+            content = await self.server.call_tool(tool_name, arguments or {})
+        except ToolError as e:
+            return CallToolResult(content=[TextContent(type="text", text=str(e))], isError=True)
+        if isinstance(content, tuple):  # newer versions of mcp return (content, structured content)
+            content = content[0]
+        return CallToolResult(content=list(content), isError=False)
+
+    async def list_prompts(self, *args, **kwargs):
+        return ListPromptsResult(prompts=await self.server.list_prompts())
+
+    async def get_prompt(self, name: str, arguments: dict | None = None, *args, **kwargs):
+        return await self.server.get_prompt(name, arguments)
+
+
+class LocalTrader(Trader):
+    """ A trader that reads its account summary and strategy in-process rather than through the accounts client. """
+
+    async def get_account_report(self) -> str:
+        return await accounts_server.read_summary_resource(self.name)
+
+    async def get_strategy(self) -> str:
+        return await accounts_server.read_strategy_resource(self.name)
+
+
+def recording_servers(cassette: Cassette) -> Callable[[dict], MCPServer]:
+    return lambda params: RecordingMCPServer(MCPFleet._server(params), server_label(params), cassette)
+
+
+def replay_servers(cassette: Cassette) -> Callable[[dict], MCPServer]:
+    def server(params: dict) -> MCPServer:
+        label = server_label(params)
+        if label in LOCAL_SERVERS:
+            return LocalMCPServer(LOCAL_SERVERS[label])
+        return ReplayMCPServer(label, cassette)
+
+    return server
+
+
+async def record(path: str, configs: list[TraderConfig] | None = None) -> Cassette:
+    """ Run one live trading cycle and save everything the models and external servers said to path. """
+    configs = configs or load_trader_configs()
+    cassette = Cassette([config.model_dump() for config in configs], started_at=time.time())
+    # Without the research cache, so that every search and fetch is in the cassette
+    fleet = MCPFleet([config.name for config in configs], recording_servers(cassette), research_cache=False)
+    traders_module.model_interceptor = lambda model_name, model: RecordingModel(model, cassette)
+    await fleet.start()
+    try:
+        traders = create_traders(configs)
+        await TraderScheduler().run(traders, lambda trader: trader.run(*fleet.servers_for(trader)))
+    finally:
+        traders_module.model_interceptor = None
+        await fleet.aclose()
+    cassette.save(path)
+    return cassette
+
+
+class Replayer:
+    """
+    Replays a cassette's cycle, as many times as wanted, against the local database:
+
+        async with Replayer(cassette) as replayer:
+            replayer.reset_accounts()
+            timings = await replayer.run_cycle()
+
+    While it is open the market simulator's clock stands still at the cassette's start time
+    (the simulator's epoch for cassettes that didn't record one) and Polygon isn't asked.
+    """
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self.configs = [TraderConfig(**trader) for trader in cassette.traders]
+        self.traders = [LocalTrader(config.name, config.lastname, config.model_name) for config in self.configs]
+        # Without the research cache, as when recording, so every cycle replays the same searches and fetches
+        self.fleet = MCPFleet([config.name for config in self.configs], replay_servers(cassette), research_cache=False)
+        self.scheduler = TraderScheduler(max_concurrency=len(self.configs) or 1, stagger_seconds=0)
+
+    async def __aenter__(self) -> "Replayer":
+        traders_module.model_interceptor = lambda model_name, model: ReplayModel(self.cassette)
+        self._clock, self._polygon_api_key = market_sim.simulator.clock, market.polygon_api_key
+        started_at = self.cassette.started_at or market_sim.simulator.epoch
+        market_sim.simulator.clock = lambda: started_at
+        market.polygon_api_key = None
+        await self.fleet.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        traders_module.model_interceptor = None
+        market_sim.simulator.clock, market.polygon_api_key = self._clock, self._polygon_api_key
+        await self.fleet.aclose()
+
+    def reset_accounts(self) -> None:
+        for config in self.configs:
+            Account.get(config.name).reset(config.strategy)
+
+    async def run_cycle(self) -> dict[str, float]:
+        """ Run every trader once, as in the recording; returns the seconds each run took. """
+        self.cassette.rewind()
+        market.price_cache.clear()
+        for trader in self.traders:
+            trader.do_trade = True  # recordings start with a trading run
+        return await self.scheduler.run(self.traders, lambda trader: trader.run(*self.fleet.servers_for(trader)))
+
+
+async def replay(path: str) -> dict:
+    """ Replay a cassette's cycle once, from freshly reset accounts in a scratch database. """
+    database.use_database(os.path.join(tempfile.mkdtemp(prefix="replay_"), "accounts.db"))
+    cassette = Cassette.load(path)
+    async with Replayer(cassette) as replayer:
+        replayer.reset_accounts()
+        timings = await replayer.run_cycle()
+    return timings | cassette.stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("cassette", help="The cassette file to write or read")
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        add_trace_processor(LogTracer())
+        add_trace_processor(MetricsTracer())
+        cassette = asyncio.run(record(args.cassette))
+        print(f"Recorded {sum(map(len, cassette.responses.values()))} model responses and "
+              f"{sum(map(len, cassette.calls.values()))} tool results to {args.cassette}")
+    else:
+        set_trace_processors([LogTracer(), MetricsTracer()])  # no trace uploads either
+        print(asyncio.run(replay(args.cassette)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from agents.mcp import MCPServer
+from mcp.types import CallToolResult
+
+from database import prune_research_cache, read_research_result, write_research_result
+
+# How long each research tool's results are reused; tools not listed here are never cached.
+# Keys also include the date, so a search is repeated at least once a day
+RESEARCH_CACHE_TTL_SECONDS = {
+    "fetch": int(os.getenv("RESEARCH_CACHE_FETCH_TTL_SECONDS", str(6 * 3600))),
+    "brave_web_search": int(os.getenv("RESEARCH_CACHE_SEARCH_TTL_SECONDS", "3600")),
+    "brave_local_search": int(os.getenv("RESEARCH_CACHE_SEARCH_TTL_SECONDS", "3600")),
+}
+
+# Results held in memory per server; the research_cache table holds the rest
+MAX_MEMORY_ENTRIES = 1_000
+
+
+def cache_key(tool: str, arguments: dict | None) -> str:
+    """ The same tool called with the same arguments on the same (UTC) day has the same key. """
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    content = json.dumps([tool, arguments or {}, day], sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class CallAbandoned(Exception):
+    """Set on an in-flight call when the task making it is cancelled, so the tasks waiting on it retry"""
+
+
+class CachingMCPServer(MCPServer):
+    """
+    Sits in front of a shared researcher MCP server (fetch, web search) so that traders asking
+    the same question in a cycle are answered once. Results are kept in memory and in the
+    research_cache table, which worker processes share, for their tool's TTL; a call that is
+    already in flight is joined rather than repeated. Error results are never cached.
+    """
+
+    def __init__(self, server: MCPServer, ttls: dict[str, float] = RESEARCH_CACHE_TTL_SECONDS):
+        super().__init__()
+        self.server = server
+        self.ttls = ttls
+        self.stats = {"calls": 0, "memory_hits": 0, "db_hits": 0, "coalesced": 0, "misses": 0, "uncached": 0}
+        self._memory: dict[str, tuple[CallToolResult, float]] = {}
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    @property
+    def name(self) -> str:
+        return self.server.name
+
+    @property
+    def session(self):
+        return self.server.session
+
+    async def connect(self):
+        await self.server.connect()
+
+    async def cleanup(self):
+        await self.server.cleanup()
+
+    async def list_tools(self, *args, **kwargs):
+        return await self.server.list_tools(*args, **kwargs)
+
+    async def list_prompts(self, *args, **kwargs):
+        return await self.server.list_prompts(*args, **kwargs)
+
+    async def get_prompt(self, *args, **kwargs):
+        return await self.server.get_prompt(*args, **kwargs)
+
+    async def call_tool(self, tool_name: str, arguments: dict | None, *args, **kwargs):
+        ttl = self.ttls.get(tool_name)
+        if ttl is None:
+            self.stats["uncached"] += 1
+            return await self.server.call_tool(tool_name, arguments, *args, **kwargs)
+        self.stats["calls"] += 1
+        key = cache_key(tool_name, arguments)
+        now = time.time()
+        cached = self._memory.get(key)
+        if cached and now - cached[1] < ttl:
+            self.stats["memory_hits"] += 1
+            return cached[0]
+        stored = read_research_result(key)
+        if stored and now - stored[1] < ttl:
+            self.stats["db_hits"] += 1
+            result = CallToolResult.model_validate(stored[0])
+            self._remember(key, result, stored[1])
+            return result
+        while key in self._in_flight:
+            try:
+                result = await asyncio.shield(self._in_flight[key])
+            except CallAbandoned:
+                continue  # the task making the call was cancelled, so one of the waiters makes it
+            self.stats["coalesced"] += 1
+            return result
+        return await self._call(key, tool_name, arguments, *args, **kwargs)
+
+    async def _call(self, key: str, tool_name: str, arguments: dict | None, *args, **kwargs) -> CallToolResult:
+        """ Call the server, sharing the result with anyone who asks for the same thing meanwhile. """
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self.stats["misses"] += 1
+        try:
+            result = await self.server.call_tool(tool_name, arguments, *args, **kwargs)
+        except asyncio.CancelledError:
+            # Only the caller was cancelled; cancelling the future would cancel the waiters too
+            future.set_exception(CallAbandoned(key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # the caller re-raises it; waiters, if any, get it too
+            raise
+        finally:
+            del self._in_flight[key]
+        future.set_result(result)
+        if not result.isError:
+            fetched_at = time.time()
+            self._remember(key, result, fetched_at)
+            write_research_result(key, tool_name, result.model_dump(mode="json"), fetched_at)
+        return result
+
+    def _remember(self, key: str, result: CallToolResult, fetched_at: float) -> None:
+        if len(self._memory) >= MAX_MEMORY_ENTRIES:
+            del self._memory[next(iter(self._memory))]
+        self._memory[key] = (result, fetched_at)
+
+
+def research_cache_stats(servers: list[MCPServer]) -> dict:
+    """ The caches' counters summed over servers, with the share of cacheable calls served locally. """
+    totals = {}
+    for server in servers:
+        for stat, count in getattr(server, "stats", {}).items():
+            totals[stat] = totals.get(stat, 0) + count
+    hits = totals.get("memory_hits", 0) + totals.get("db_hits", 0) + totals.get("coalesced", 0)
+    totals["hit_rate"] = hits / totals["calls"] if totals.get("calls") else 0.0
+    return totals
+
+
+def prune() -> int:
+    """ Delete cached results that every tool's TTL has expired. """
+    return prune_research_cache(max(RESEARCH_CACHE_TTL_SECONDS.values()))
@@ -0,0 +1,79 @@
+import numpy as np
+
+# Rolling volatility is measured over this many consecutive portfolio value points
+VOLATILITY_WINDOW = 20
+
+
+def max_drawdown(values: np.ndarray) -> float:
+    """ Largest peak-to-trough fall, as a fraction of the peak. """
+    if len(values) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(values)
+    return float(np.max((peaks - values) / np.where(peaks > 0, peaks, 1.0)))
+
+
+def rolling_volatility(values: np.ndarray, window: int = VOLATILITY_WINDOW) -> np.ndarray:
+    """ Standard deviation of point-to-point log returns over each trailing window. """
+    if len(values) < 2:
+        return np.zeros(0)
+    returns = np.diff(np.log(np.where(values > 0, values, np.nan)))
+    returns = np.nan_to_num(returns)
+    window = min(window, len(returns))
+    windows = np.lib.stride_tricks.sliding_window_view(returns, window)
+    return windows.std(axis=1)
+
+
+def analyze(
+    balance: float,
+    symbols: list[str],
+    quantities: np.ndarray,
+    prices: np.ndarray,
+    cost_basis: np.ndarray,
+    values: np.ndarray,
+    window: int = VOLATILITY_WINDOW,
+) -> dict:
+    """
+    Value a portfolio and measure its risk in one batched pass.
+
+    Args:
+        balance: Cash held
+        symbols: Symbols of the positions, aligned with the arrays below
+        quantities: Shares held of each symbol
+        prices: Current price of each symbol
+        cost_basis: What was paid for the shares currently held of each symbol
+        values: History of total portfolio values, oldest first
+        window: Number of points in the rolling volatility window
+
+    Returns:
+        A dict with the total value, per-position value, weight and unrealized P&L,
+        concentration, and drawdown and volatility of the value history
+    """
+    market_values = quantities * prices
+    total = balance + market_values.sum()
+    weights = market_values / total if total else np.zeros_like(market_values)
+    unrealized = market_values - cost_basis
+    history = np.append(values, total)
+    volatility = rolling_volatility(history, window)
+    return {
+        "total_value": float(total),
+        "cash": float(balance),
+        "invested_value": float(market_values.sum()),
+        "positions": {
+            symbol: {
+                "quantity": int(quantity),
+                "price": float(price),
+                "value": float(value),
+                "weight": float(weight),
+                "unrealized_profit_loss": float(pnl),
+            }
+            for symbol, quantity, price, value, weight, pnl in zip(
+                symbols, quantities, prices, market_values, weights, unrealized
+            )
+        },
+        "unrealized_profit_loss": float(unrealized.sum()),
+        "largest_weight": float(weights.max()) if len(weights) else 0.0,
+        "concentration_hhi": float(np.square(weights).sum()),
+        "max_drawdown": max_drawdown(history),
+        "current_drawdown": float(1 - total / history.max()) if history.max() > 0 else 0.0,
+        "volatility": float(volatility[-1]) if len(volatility) else 0.0,
+    }
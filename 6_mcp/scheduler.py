@@ -0,0 +1,156 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Iterable
+from agents import Model
+from dotenv import load_dotenv
+from database import write_log
+
+load_dotenv(override=True)
+
+MAX_CONCURRENT_TRADERS = int(os.getenv("MAX_CONCURRENT_TRADERS", "4"))
+TRADER_STAGGER_SECONDS = float(os.getenv("TRADER_STAGGER_SECONDS", "5"))
+
+# Requests and tokens per minute we allow ourselves on each provider; override with e.g. DEEPSEEK_RPM=120
+DEFAULT_RATE_LIMITS = {
+    "openai": (500, 200_000),
+    "openrouter": (200, 200_000),
+    "deepseek": (60, 100_000),
+    "grok": (60, 100_000),
+    "gemini": (10, 250_000),
+}
+
+
+class TokenBucket:
+    """
+    Allows `per_minute` units a minute, in bursts of up to `capacity`.
+    Waiters are served in arrival order. A bucket can be debited after the fact, below zero,
+    for costs only known once a call has finished; later callers then wait the debt out.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None, clock=time.monotonic):
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """ Take `amount` units, waiting until they're available; returns the seconds waited. """
+        started = self.clock()
+        needed = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.level < needed:
+                await asyncio.sleep((needed - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+        return self.clock() - started
+
+    def debit(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+
+class RateBudget:
+    """ A provider's request and token budgets. Tokens are charged after each call, from its reported usage. """
+
+    def __init__(self, provider: str, requests_per_minute: float, tokens_per_minute: float):
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.stats = {"requests": 0, "tokens": 0, "seconds_waited": 0.0}
+
+    async def acquire(self) -> None:
+        waited = await self.requests.acquire(1)
+        waited += await self.tokens.acquire(0)
+        self.stats["requests"] += 1
+        self.stats["seconds_waited"] += waited
+
+    def record(self, usage) -> None:
+        tokens = getattr(usage, "total_tokens", 0) or 0
+        self.tokens.debit(tokens)
+        self.stats["tokens"] += tokens
+
+
+_budgets: dict[str, RateBudget] = {}
+_budget_shares = 1
+
+
+def share_rate_budgets(shares: int) -> None:
+    """ Give this process 1/shares of each provider's limits, when the traders are split across processes. """
+    global _budget_shares
+    _budget_shares = shares
+    _budgets.clear()
+
+
+def rate_budget(provider: str) -> RateBudget:
+    """ The budget shared by every model on a provider. """
+    if provider not in _budgets:
+        rpm, tpm = DEFAULT_RATE_LIMITS.get(provider, DEFAULT_RATE_LIMITS["openai"])
+        rpm = float(os.getenv(f"{provider.upper()}_RPM", rpm))
+        tpm = float(os.getenv(f"{provider.upper()}_TPM", tpm))
+        _budgets[provider] = RateBudget(provider, rpm / _budget_shares, tpm / _budget_shares)
+    return _budgets[provider]
+
+
+class RateLimitedModel(Model):
+    """ Wraps a model so that every call first waits for room in its provider's budget. """
+
+    def __init__(self, model: Model, budget: RateBudget):
+        self.model = model
+        self.budget = budget
+
+    async def get_response(self, *args, **kwargs):
+        await self.budget.acquire()
+        response = await self.model.get_response(*args, **kwargs)
+        self.budget.record(response.usage)
+        return response
+
+    async def stream_response(self, *args, **kwargs):
+        await self.budget.acquire()
+        async for event in self.model.stream_response(*args, **kwargs):
+            if getattr(event, "type", None) == "response.completed":
+                self.budget.record(event.response.usage)
+            yield event
+
+
+class TraderScheduler:
+    """
+    Runs a cycle of traders with at most `max_concurrency` running at once, starting runs
+    at least `stagger_seconds` apart so their LLM calls don't land together, and times each run.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_TRADERS, stagger_seconds: float = TRADER_STAGGER_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.stagger_seconds = stagger_seconds
+        self.timings: dict[str, float] = {}
+
+    async def run(self, traders: Iterable, run_trader: Callable[..., Awaitable]) -> dict[str, float]:
+        """ Call run_trader(trader) for each trader; returns the wall-clock seconds of each run. """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        starting = asyncio.Lock()
+        last_start = float("-inf")
+
+        async def run_one(trader) -> None:
+            nonlocal last_start
+            async with semaphore:
+                async with starting:
+                    await asyncio.sleep(max(0.0, last_start + self.stagger_seconds - time.monotonic()))
+                    last_start = time.monotonic()
+                started = time.perf_counter()
+                try:
+                    await run_trader(trader)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    self.timings[trader.name] = elapsed
+                    write_log(trader.name, "trace", f"Run took {elapsed:.1f}s")
+
+        await asyncio.gather(*[run_one(trader) for trader in traders])
+        return dict(self.timings)
@@ -0,0 +1,29 @@
+"""
+Run cleanup when a stdio MCP server is stopped.
+
+MCP clients end the stdio servers they started with SIGTERM, which skips atexit handlers, so
+anything a server still holds in memory - log rows waiting to be batched, push notifications
+being coalesced - would be lost. Register it with on_terminate() before mcp.run().
+"""
+
+import os
+import signal
+from typing import Callable
+
+
+def on_terminate(callback: Callable[[], None]) -> None:
+    """
+    Call callback when the process is sent SIGTERM, then end it as the previous handler would have.
+    Handlers chain, so several callbacks can be registered. Call it from the main thread.
+    """
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def terminate(signum, frame):
+        callback()
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            signal.signal(signum, signal.SIG_DFL if previous is None else previous)
+            os.kill(os.getpid(), signum)
+
+    signal.signal(signal.SIGTERM, terminate)
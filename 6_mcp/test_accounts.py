@@ -0,0 +1,134 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+SCRATCH = tempfile.mkdtemp(prefix="test_accounts_")
+
+
+def setUpModule():
+    """
+    Import the project from a scratch directory, since importing database migrates the accounts.db
+    in the working directory, and then point it at that scratch database by absolute path.
+    """
+    global database, ledger, market, Account, simulator
+    cwd = os.getcwd()
+    os.chdir(SCRATCH)
+    try:
+        import database
+        import ledger
+        import market
+        from accounts import Account
+        from market_sim import simulator
+    finally:
+        os.chdir(cwd)
+    database.use_database(os.path.join(SCRATCH, "accounts.db"))
+    market.polygon_api_key = None
+
+
+class ScratchAccountTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = simulator.clock
+        simulator.clock = lambda: simulator.epoch  # the same prices throughout a test
+
+    def tearDown(self):
+        simulator.clock = self.clock
+
+
+class TestAccountSummary(ScratchAccountTest):
+    def setUp(self):
+        super().setUp()
+        self.account = Account.get("tester")
+        self.account.reset("")
+        self.account.buy_shares("AAPL", 1, "r" * 300)
+
+    def test_rationale_that_fits_at_200_characters_keeps_them(self):
+        full = len(self.account.summary(token_budget=100_000))
+        # Over budget with the whole rationale, within it once the rationale is cut to 200 characters
+        summary = json.loads(self.account.summary(token_budget=(full - 100 + 3) // 4))
+        self.assertEqual(len(summary["recent_trades"]), 1)
+        self.assertEqual(summary["recent_trades"][0]["rationale"], "r" * 200)
+
+
+class TestConcurrentWrites(ScratchAccountTest):
+    def test_stale_writer_is_retried(self):
+        Account.get("stale").reset("")
+        first = Account.get("stale")
+        second = Account.get("stale")
+        first.buy_shares("AAPL", 2, "first")
+        second.buy_shares("MSFT", 3, "second")  # read before the first trade, so its save is stale
+        first.sell_shares("AAPL", 1, "first again")
+        account = Account.get("stale")
+        self.assertEqual(account.holdings, {"AAPL": 1, "MSFT": 3})
+        self.assertEqual(len(account.transactions), 3)
+        self.assertEqual(ledger.verify("stale"), [])
+
+    def test_concurrent_creates_keep_one_account(self):
+        name = "created"
+        ready = threading.Barrier(8)
+        created = []
+
+        def create(balance_cents):
+            ready.wait()
+            created.append(database.create_account(name, {
+                "name": name,
+                "balance_cents": balance_cents,
+                "strategy": "",
+                "holdings": {},
+                "transactions": [],
+                "portfolio_value_time_series": [],
+                "ledger": ledger.Ledger().to_record(),
+            }))
+            database.close()
+
+        threads = [threading.Thread(target=create, args=(balance,)) for balance in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(created), [False] * 7 + [True])
+        self.assertEqual(database.read_account_version(name), 0)
+        balance_cents = database.read_balance(name)
+        # Getting the account now reads the one that was created rather than replacing it
+        self.assertEqual(Account.get(name).balance_cents, balance_cents)
+        self.assertEqual(database.read_account_version(name), 0)
+
+
+class TestLegacyMigration(unittest.TestCase):
+    def test_blob_accounts_migrate_to_cents_that_verify(self):
+        path = os.path.join(SCRATCH, "legacy.db")
+        rng = random.Random(3)
+        transactions, holdings = [], {}
+        for _ in range(200):
+            symbol = rng.choice(["AAPL", "MSFT", "NVDA"])
+            price = round(rng.uniform(50, 500), rng.choice([2, 3, 4]))
+            held = holdings.get(symbol, 0)
+            quantity = -rng.randint(1, held) if held and rng.random() < 0.4 else rng.randint(1, 7)
+            holdings[symbol] = held + quantity
+            transactions.append(
+                {"symbol": symbol, "quantity": quantity, "price": price, "timestamp": "2025-01-01 00:00:00", "rationale": ""}
+            )
+        blob = {
+            "name": "warren",
+            "balance": 10_000 - sum(t["quantity"] * t["price"] for t in transactions),
+            "strategy": "",
+            "holdings": {symbol: quantity for symbol, quantity in holdings.items() if quantity},
+            "transactions": transactions,
+            "portfolio_value_time_series": [],
+        }
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE accounts (name TEXT PRIMARY KEY, account TEXT)")
+            conn.execute("INSERT INTO accounts VALUES (?, ?)", ("warren", json.dumps(blob)))
+        conn.close()
+        try:
+            database.use_database(path)
+            self.assertEqual(ledger.verify("warren"), [])
+        finally:
+            database.use_database(os.path.join(SCRATCH, "accounts.db"))
+
+
+if __name__ == "__main__":
+    unittest.main()
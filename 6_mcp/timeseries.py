@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+# The portfolio chart never draws more points than this, however long the history
+CHART_POINTS = 500
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: the indices of `threshold` points that keep
+    the visual shape of the series. The first and last points are always kept; from each bucket
+    in between, the point forming the largest triangle with the previous pick and the average
+    of the next bucket is kept, which preserves peaks and troughs that averaging would flatten.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    picked = np.empty(threshold, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        following = slice(end, edges[bucket + 2] if bucket + 2 < len(edges) else n)
+        next_x, next_y = x[following].mean(), y[following].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        picked[bucket + 1] = previous
+    return picked
+
+
+def downsample(points: list[tuple[str, float]], max_points: int = CHART_POINTS) -> pd.DataFrame:
+    """ A (datetime, value) series as a DataFrame of at most max_points rows, chosen by LTTB. """
+    df = pd.DataFrame(points, columns=["datetime", "value"])
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    if len(df) <= max_points:
+        return df
+    x = df["datetime"].to_numpy(dtype="datetime64[s]").astype(np.float64)
+    keep = lttb(x, df["value"].to_numpy(dtype=np.float64), max_points)
+    return df.iloc[keep].reset_index(drop=True)
@@ -1,29 +1,65 @@
 from agents import TracingProcessor, Trace, Span
-from database import write_log
+from database import write_log, log_sink
 import secrets
 import string
 
 ALPHANUM = string.ascii_lowercase + string.digits 
 
+# Traces started by make_trace_id() that haven't been released, mapped to the trader they belong to,
+# so span handlers find the trader with a dict lookup instead of parsing the id on every event.
+# Ids that are never released are evicted oldest first once there are this many
+MAX_REGISTERED_TRACES = 10_000
+
+# Random bytes are turned into id characters in one translate() call: each byte below 252 maps to
+# ALPHANUM[byte % 36] and the rest are dropped, so every character is equally likely
+_ALPHANUM_BYTES = bytes(ord(ALPHANUM[byte % len(ALPHANUM)]) if byte < 252 else 0 for byte in range(256))
+_UNEVEN_BYTES = bytes(range(252, 256))
+
+_trace_traders: dict[str, str] = {}
+
 def make_trace_id(tag: str) -> str:
     """
-    Return a string of the form 'trace_<tag><random>',
-    where the total length after 'trace_' is 32 chars.
+    Return a string of the form 'trace_<tag>0<random>', where the total length after 'trace_'
+    is 32 chars, and register it as a trace of the trader named tag until release_trace_id().
     """
-    tag += "0"
-    pad_len = 32 - len(tag)
-    random_suffix = ''.join(secrets.choice(ALPHANUM) for _ in range(pad_len))
-    return f"trace_{tag}{random_suffix}"
+    prefix = tag + "0"
+    pad_len = 32 - len(prefix)
+    random_suffix = b""
+    while len(random_suffix) < pad_len:
+        random_suffix += secrets.token_bytes(2 * pad_len).translate(_ALPHANUM_BYTES, _UNEVEN_BYTES)
+    random_suffix = random_suffix[:pad_len].decode()
+    trace_id = f"trace_{prefix}{random_suffix}"
+    if len(_trace_traders) >= MAX_REGISTERED_TRACES:
+        del _trace_traders[next(iter(_trace_traders))]
+    _trace_traders[trace_id] = tag
+    return trace_id
+
+def release_trace_id(trace_id: str) -> None:
+    """ Forget a trace once it has ended. """
+    _trace_traders.pop(trace_id, None)
+
+def trader_name(trace_id: str) -> str | None:
+    """ The trader a trace id made by make_trace_id() belongs to, or None for other traces. """
+    return _trace_traders.get(trace_id)
+
+def _describe(event: str, span: Span) -> str:
+    """ A log message for a span event, such as 'Started function buy_shares' """
+    message = event
+    if span.span_data:
+        if span.span_data.type:
+            message += f" {span.span_data.type}"
+        if getattr(span.span_data, "name", None):
+            message += f" {span.span_data.name}"
+        if getattr(span.span_data, "server", None):
+            message += f" {span.span_data.server}"
+    if span.error:
+        message += f" {span.error}"
+    return message
 
 class LogTracer(TracingProcessor):
 
     def get_name(self, trace_or_span: Trace | Span) -> str | None:
-        trace_id = trace_or_span.trace_id
-        name = trace_id.split("_")[1]
-        if '0' in name:
-            return name.split("0")[0]
-        else:
-            return None
+        return trader_name(trace_or_span.trace_id)
 
     def on_trace_start(self, trace) -> None:
         name = self.get_name(trace)
@@ -37,39 +73,16 @@ class LogTracer(TracingProcessor):
 
     def on_span_start(self, span) -> None:
         name = self.get_name(span)
-        type = span.span_data.type if span.span_data else "span"
         if name:
-            message = "Started"
-            if span.span_data:
-                if span.span_data.type:
-                    message += f" {span.span_data.type}"
-                if hasattr(span.span_data, "name") and span.span_data.name:
-                    message += f" {span.span_data.name}"
-                if hasattr(span.span_data, "server") and span.span_data.server:
-                    message += f" {span.span_data.server}"
-            if span.error:
-                message += f" {span.error}"
-            write_log(name, type, message)
+            write_log(name, span.span_data.type if span.span_data else "span", _describe("Started", span))
 
     def on_span_end(self, span) -> None:
         name = self.get_name(span)
-        type = span.span_data.type if span.span_data else "span"
         if name:
-            message = "Ended"
-            if span.span_data:
-                if span.span_data.type:
-                    
-                    message += f" {span.span_data.type}"
-                if hasattr(span.span_data, "name") and span.span_data.name:
-                    message += f" {span.span_data.name}"
-                if hasattr(span.span_data, "server") and span.span_data.server:
-                    message += f" {span.span_data.server}"
-            if span.error:
-                message += f" {span.error}"
-            write_log(name, type, message)
+            write_log(name, span.span_data.type if span.span_data else "span", _describe("Ended", span))
 
     def force_flush(self) -> None:
-        pass
+        log_sink.flush()
 
     def shutdown(self) -> None:
-        pass
\ No newline at end of file
+        log_sink.shutdown()
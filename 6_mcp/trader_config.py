@@ -0,0 +1,38 @@
+import json
+import os
+from typing import List
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+TRADERS_CONFIG = os.getenv("TRADERS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "traders.json"))
+USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
+
+
+class TraderConfig(BaseModel):
+    name: str
+    lastname: str
+    model_name: str
+    short_model_name: str
+    strategy: str
+
+
+def load_trader_configs(path: str = TRADERS_CONFIG, use_many_models: bool = USE_MANY_MODELS) -> List[TraderConfig]:
+    """
+    Read the traders from the config file.
+    Unless use_many_models is set, every trader runs on the file's default model.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    traders = [TraderConfig(**trader) for trader in config["traders"]]
+    if not use_many_models:
+        for trader in traders:
+            trader.model_name = config["default_model_name"]
+            trader.short_model_name = config["default_short_model_name"]
+    return traders
+
+
+def shard(configs: List[TraderConfig], index: int, count: int) -> List[TraderConfig]:
+    """ The traders handled by worker `index` of `count`. """
+    return configs[index::count]
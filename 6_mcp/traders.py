@@ -1,12 +1,14 @@
 from contextlib import AsyncExitStack
-from accounts_client import read_accounts_resource, read_strategy_resource
-from tracers import make_trace_id
-from agents import Agent, Tool, Runner, OpenAIChatCompletionsModel, trace
+from accounts_client import read_summary_resource, read_strategy_resource
+from tracers import make_trace_id, release_trace_id
+from agents import Agent, Model, Tool, Runner, OpenAIChatCompletionsModel, trace
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import os
-import json
 from agents.mcp import MCPServerStdio
+from agents.models.openai_provider import OpenAIProvider
+from typing import Callable
+from scheduler import RateLimitedModel, rate_budget
 from templates import (
     researcher_instructions,
     trader_instructions,
@@ -34,19 +36,27 @@ openrouter_client = AsyncOpenAI(base_url=OPENROUTER_BASE_URL, api_key=openrouter
 deepseek_client = AsyncOpenAI(base_url=DEEPSEEK_BASE_URL, api_key=deepseek_api_key)
 grok_client = AsyncOpenAI(base_url=GROK_BASE_URL, api_key=grok_api_key)
 gemini_client = AsyncOpenAI(base_url=GEMINI_BASE_URL, api_key=google_api_key)
+openai_provider = OpenAIProvider()
+
+# Set by replay.py to record or replay model calls: given a model name and its rate-limited model,
+# it returns the model the agents should use
+model_interceptor: Callable[[str, Model], Model] | None = None
 
 
 def get_model(model_name: str):
+    """Every model is wrapped in its provider's rate budget, which all traders on that provider share"""
     if "/" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=openrouter_client)
+        model, provider = OpenAIChatCompletionsModel(model=model_name, openai_client=openrouter_client), "openrouter"
     elif "deepseek" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=deepseek_client)
+        model, provider = OpenAIChatCompletionsModel(model=model_name, openai_client=deepseek_client), "deepseek"
     elif "grok" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=grok_client)
+        model, provider = OpenAIChatCompletionsModel(model=model_name, openai_client=grok_client), "grok"
     elif "gemini" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=gemini_client)
+        model, provider = OpenAIChatCompletionsModel(model=model_name, openai_client=gemini_client), "gemini"
     else:
-        return model_name
+        model, provider = openai_provider.get_model(model_name), "openai"
+    model = RateLimitedModel(model, rate_budget(provider))
+    return model_interceptor(model_name, model) if model_interceptor else model
 
 
 async def get_researcher(mcp_servers, model_name) -> Agent:
@@ -84,15 +94,16 @@ class Trader:
         return self.agent
 
     async def get_account_report(self) -> str:
-        account = await read_accounts_resource(self.name)
-        account_json = json.loads(account)
-        account_json.pop("portfolio_value_time_series", None)
-        return json.dumps(account_json)
+        """The compact account summary, sized to a fixed token budget however long the trader's history"""
+        return await read_summary_resource(self.name)
+
+    async def get_strategy(self) -> str:
+        return await read_strategy_resource(self.name)
 
     async def run_agent(self, trader_mcp_servers, researcher_mcp_servers):
         self.agent = await self.create_agent(trader_mcp_servers, researcher_mcp_servers)
         account = await self.get_account_report()
-        strategy = await read_strategy_resource(self.name)
+        strategy = await self.get_strategy()
         message = (
             trade_message(self.name, strategy, account)
             if self.do_trade
@@ -117,15 +128,22 @@ class Trader:
                 ]
                 await self.run_agent(trader_mcp_servers, researcher_mcp_servers)
 
-    async def run_with_trace(self):
+    async def run_with_trace(self, trader_mcp_servers=None, researcher_mcp_servers=None):
         trace_name = f"{self.name}-trading" if self.do_trade else f"{self.name}-rebalancing"
         trace_id = make_trace_id(f"{self.name.lower()}")
-        with trace(trace_name, trace_id=trace_id):
-            await self.run_with_mcp_servers()
-
-    async def run(self):
         try:
-            await self.run_with_trace()
+            with trace(trace_name, trace_id=trace_id):
+                if trader_mcp_servers is None:
+                    await self.run_with_mcp_servers()
+                else:
+                    await self.run_agent(trader_mcp_servers, researcher_mcp_servers)
+        finally:
+            release_trace_id(trace_id)
+
+    async def run(self, trader_mcp_servers=None, researcher_mcp_servers=None):
+        """Run one trading cycle, on already-connected MCP servers if given, or else on servers of its own"""
+        try:
+            await self.run_with_trace(trader_mcp_servers, researcher_mcp_servers)
         except Exception as e:
             print(f"Error running trader {self.name}: {e}")
         self.do_trade = not self.do_trade
@@ -1,10 +1,18 @@
 from traders import Trader
-from typing import List
+from typing import Callable, List
 import asyncio
+from agents.mcp import MCPServer, MCPServerStdio
+from mcp_params import trader_mcp_server_params, shared_researcher_mcp_server_params, memory_mcp_server_params
 from tracers import LogTracer
+from metrics import MetricsTracer
+from trader_config import TraderConfig, load_trader_configs, shard
+from scheduler import TraderScheduler, share_rate_budgets
+from research_cache import CachingMCPServer, research_cache_stats, prune as prune_research_cache
 from agents import add_trace_processor
 from market import is_market_open
+from database import archive_logs, compact_portfolio_values, prune_span_metrics
 from dotenv import load_dotenv
+import multiprocessing
 import os
 
 load_dotenv(override=True)
@@ -13,42 +21,145 @@ RUN_EVERY_N_MINUTES = int(os.getenv("RUN_EVERY_N_MINUTES", "60"))
 RUN_EVEN_WHEN_MARKET_IS_CLOSED = (
     os.getenv("RUN_EVEN_WHEN_MARKET_IS_CLOSED", "false").strip().lower() == "true"
 )
-USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
+MCP_HEALTH_CHECK_TIMEOUT_SECONDS = 10
+TRADING_FLOOR_WORKERS = int(os.getenv("TRADING_FLOOR_WORKERS", "1"))
 
-names = ["Warren", "George", "Ray", "Cathie"]
-lastnames = ["Patience", "Bold", "Systematic", "Crypto"]
+trader_configs = load_trader_configs()
+names = [config.name for config in trader_configs]
+lastnames = [config.lastname for config in trader_configs]
+model_names = [config.model_name for config in trader_configs]
+short_model_names = [config.short_model_name for config in trader_configs]
 
-if USE_MANY_MODELS:
-    model_names = [
-        "gpt-4.1-mini",
-        "deepseek-chat",
-        "gemini-2.5-flash-preview-04-17",
-        "grok-3-mini-beta",
-    ]
-    short_model_names = ["GPT 4.1 Mini", "DeepSeek V3", "Gemini 2.5 Flash", "Grok 3 Mini"]
-else:
-    model_names = ["gpt-4o-mini"] * 4
-    short_model_names = ["GPT 4o mini"] * 4
 
+def create_traders(configs: List[TraderConfig] = trader_configs) -> List[Trader]:
+    return [Trader(config.name, config.lastname, config.model_name) for config in configs]
+
+
+class MCPFleet:
+    """
+    Supervises the MCP servers for the whole trading floor.
+    The stateless servers (accounts, push, market, fetch, search) are started once and shared
+    by every trader; only the memory server, which holds each trader's knowledge graph, is per trader.
+    Fetch and search sit behind a cache, so research several traders ask for is done once.
+    Servers are health-checked before each cycle and restarted if they have crashed.
+    Connect, restart and close from the same task - MCP's stdio transport requires it, so these
+    go one server at a time rather than through asyncio.gather, which would run each in a child task.
+    server_factory builds a server from its params; replay.py passes one to record or replay tool calls.
+    """
+
+    def __init__(
+        self,
+        trader_names: List[str],
+        server_factory: Callable[[dict], MCPServer] | None = None,
+        research_cache: bool = True,
+    ):
+        factory = server_factory or self._server
+        self.trader_servers = [factory(params) for params in trader_mcp_server_params]
+        self.researcher_servers = [
+            CachingMCPServer(factory(params)) if research_cache else factory(params)
+            for params in shared_researcher_mcp_server_params
+        ]
+        self.memory_servers = {name: factory(memory_mcp_server_params(name)) for name in trader_names}
+
+    @staticmethod
+    def _server(params) -> MCPServerStdio:
+        return MCPServerStdio(params, client_session_timeout_seconds=120, cache_tools_list=True)
+
+    def all_servers(self) -> List[MCPServer]:
+        return self.trader_servers + self.researcher_servers + list(self.memory_servers.values())
+
+    async def start(self) -> None:
+        for server in self.all_servers():
+            await server.connect()
+
+    async def _is_healthy(self, server: MCPServer) -> bool:
+        if not hasattr(server, "session"):
+            return True  # in-process stand-ins have no session to lose
+        if server.session is None:
+            return False
+        try:
+            await asyncio.wait_for(server.session.send_ping(), MCP_HEALTH_CHECK_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+    async def _restart(self, server: MCPServer) -> None:
+        print(f"Restarting MCP server {server.name}")
+        try:
+            await server.cleanup()
+        except Exception as e:
+            print(f"Error cleaning up MCP server {server.name}: {e}")
+        await server.connect()
 
-def create_traders() -> List[Trader]:
-    traders = []
-    for name, lastname, model_name in zip(names, lastnames, model_names):
-        traders.append(Trader(name, lastname, model_name))
-    return traders
+    async def ensure_healthy(self) -> None:
+        servers = self.all_servers()
+        health = await asyncio.gather(*[self._is_healthy(server) for server in servers])
+        for server, ok in zip(servers, health):
+            if not ok:
+                await self._restart(server)
 
+    def research_cache_stats(self) -> dict:
+        return research_cache_stats(self.researcher_servers)
 
-async def run_every_n_minutes():
+    def servers_for(self, trader: Trader) -> tuple[List[MCPServer], List[MCPServer]]:
+        return self.trader_servers, self.researcher_servers + [self.memory_servers[trader.name]]
+
+    async def aclose(self) -> None:
+        for server in reversed(self.all_servers()):
+            try:
+                await server.cleanup()
+            except Exception as e:
+                print(f"Error cleaning up MCP server {server.name}: {e}")
+
+
+async def run_every_n_minutes(configs: List[TraderConfig] = trader_configs, archive: bool = True):
     add_trace_processor(LogTracer())
-    traders = create_traders()
-    while True:
-        if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
-            await asyncio.gather(*[trader.run() for trader in traders])
-        else:
-            print("Market is closed, skipping run")
-        await asyncio.sleep(RUN_EVERY_N_MINUTES * 60)
+    add_trace_processor(MetricsTracer())
+    traders = create_traders(configs)
+    fleet = MCPFleet([trader.name for trader in traders])
+    scheduler = TraderScheduler()
+    await fleet.start()
+    try:
+        while True:
+            if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
+                await fleet.ensure_healthy()
+                timings = await scheduler.run(traders, lambda trader: trader.run(*fleet.servers_for(trader)))
+                print("Run times: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in timings.items()))
+                cache = fleet.research_cache_stats()
+                print(f"Research cache: {cache['hit_rate']:.0%} of {cache['calls']} searches and fetches served locally")
+            else:
+                print("Market is closed, skipping run")
+            if archive:
+                archive_logs()
+                compact_portfolio_values()
+                prune_span_metrics()
+                prune_research_cache()
+            await asyncio.sleep(RUN_EVERY_N_MINUTES * 60)
+    finally:
+        await fleet.aclose()
+
+
+def run_worker(index: int, count: int) -> None:
+    """ Run one shard of the trading floor, with its own MCP servers and its share of the rate limits. """
+    share_rate_budgets(count)
+    asyncio.run(run_every_n_minutes(shard(trader_configs, index, count), archive=index == 0))
+
+
+def run_sharded(workers: int = TRADING_FLOOR_WORKERS) -> None:
+    """ Split the traders across worker processes, so one host can run many more of them. """
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(index, workers), name=f"trading-floor-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
 
 
 if __name__ == "__main__":
-    print(f"Starting scheduler to run every {RUN_EVERY_N_MINUTES} minutes")
-    asyncio.run(run_every_n_minutes())
+    print(f"Starting scheduler to run {len(trader_configs)} traders every {RUN_EVERY_N_MINUTES} minutes")
+    if TRADING_FLOOR_WORKERS > 1:
+        run_sharded(TRADING_FLOOR_WORKERS)
+    else:
+        asyncio.run(run_every_n_minutes())
@@ -10,6 +10,11 @@ from .api.openrouter_utils import (
     get_usage_info
 )
 
+from .api.notifier import (
+    PushNotifier,
+    push_notification
+)
+
 from .helpers import (
     load_env_file,
     check_api_key,
@@ -28,6 +33,8 @@ __all__ = [
     "call_openrouter_api",
     "get_model_response", 
     "get_usage_info",
+    "PushNotifier",
+    "push_notification",
     # Helper functions
     "load_env_file",
     "check_api_key",
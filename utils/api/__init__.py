@@ -10,8 +10,19 @@ from .openrouter_utils import (
     get_usage_info
 )
 
+from .notifier import (
+    PushNotifier,
+    StubEndpoint,
+    notifier,
+    push_notification
+)
+
 __all__ = [
     "call_openrouter_api",
     "get_model_response",
-    "get_usage_info"
+    "get_usage_info",
+    "PushNotifier",
+    "StubEndpoint",
+    "notifier",
+    "push_notification"
 ] 
\ No newline at end of file
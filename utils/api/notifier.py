@@ -0,0 +1,361 @@
+"""
+Non-blocking push notifications through Pushover.
+
+notify() queues a message and returns at once, from sync or async code on any thread.
+A background thread runs an event loop that delivers the queue over a pooled httpx client:
+messages that arrive within a short window of each other are coalesced into one digest,
+requests have timeouts, and failed deliveries are retried with exponential backoff.
+
+Set PUSHOVER_URL to send to a different endpoint, such as the local stub:
+
+    python -m utils.api.notifier --stub --port 8765
+    PUSHOVER_URL=http://127.0.0.1:8765/1/messages.json python app.py
+"""
+
+import argparse
+import asyncio
+import atexit
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+import httpx
+
+PUSHOVER_URL = "https://api.pushover.net/1/messages.json"
+
+# Pushover rejects messages longer than this
+MAX_MESSAGE_LENGTH = 1024
+
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 60.0
+
+_CLOSE = object()
+
+
+def digest(messages: List[str], max_length: int = MAX_MESSAGE_LENGTH) -> str:
+    """
+    Combine messages into one notification, truncated to max_length.
+
+    Args:
+        messages: The messages, oldest first
+
+    Returns:
+        The single message unchanged, or a digest listing all of them
+    """
+    text = messages[0] if len(messages) == 1 else f"{len(messages)} notifications:\n" + "\n".join(
+        f"• {message}" for message in messages
+    )
+    return text if len(text) <= max_length else text[: max_length - 1] + "…"
+
+
+class _Worker:
+    """
+    One background thread of a PushNotifier, with its own event loop and queue. After close() a new
+    worker takes over while the old one finishes delivering, so a worker only ever reads its own queue.
+    held counts the messages queued to it that it hasn't finished with; they are dropped if it dies.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.queue = asyncio.Queue()
+        self.pid = os.getpid()
+        self.thread = None
+        self.held = 0
+        self.done = False
+
+
+class PushNotifier:
+    """
+    Delivers push notifications in the background so callers never wait on the network.
+
+    Args:
+        url: The endpoint to post to (defaults to PUSHOVER_URL from the environment, or Pushover's API)
+        token: Pushover application token (defaults to PUSHOVER_TOKEN)
+        user: Pushover user key (defaults to PUSHOVER_USER)
+        timeout: Seconds allowed for each request
+        coalesce_seconds: How long to gather a burst of messages into one digest
+        max_batch: The most messages in one digest
+        max_attempts: Deliveries tried before a digest is dropped
+        max_pending: Messages that may wait for delivery before new ones are dropped
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        token: Optional[str] = None,
+        user: Optional[str] = None,
+        timeout: float = 10.0,
+        coalesce_seconds: float = 2.0,
+        max_batch: int = 20,
+        max_attempts: int = 5,
+        max_pending: int = 1000,
+    ):
+        self.url = url
+        self.token = token
+        self.user = user
+        self.timeout = timeout
+        self.coalesce_seconds = coalesce_seconds
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self.stats = {"submitted": 0, "sent": 0, "digests": 0, "retries": 0, "dropped": 0}
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._start_lock = threading.RLock()
+        self._worker = None
+        atexit.register(self.close)
+
+    def _running(self) -> bool:
+        worker = self._worker
+        return worker is not None and worker.pid == os.getpid() and not worker.done and worker.thread.is_alive()
+
+    def _ensure_started(self) -> "_Worker":
+        """Start a worker, or a new one after close(), a fork, or the old one dying, and return it."""
+        with self._start_lock:
+            if self._running():
+                return self._worker
+            # Read the environment now rather than at import, so callers can load .env first
+            self.url = self.url or os.getenv("PUSHOVER_URL") or PUSHOVER_URL
+            self.token = self.token or os.getenv("PUSHOVER_TOKEN")
+            self.user = self.user or os.getenv("PUSHOVER_USER")
+            if self._worker is not None and self._worker.pid != os.getpid():
+                with self._idle:
+                    self._pending = 0  # the parent's queue, which this process can't deliver
+            self._worker = _Worker()
+            self._worker.thread = threading.Thread(target=self._work, args=(self._worker,), name="push-notifier", daemon=True)
+            self._worker.thread.start()
+            return self._worker
+
+    def notify(self, message: str) -> bool:
+        """
+        Queue a message for delivery and return immediately.
+
+        Args:
+            message: The text to send
+
+        Returns:
+            True if queued, False if it was dropped because too many messages are waiting
+        """
+        # Under the start lock, so a close() on another thread can't retire the worker in between
+        with self._start_lock:
+            while True:
+                worker = self._ensure_started()
+                with self._idle:
+                    if worker.done:
+                        continue  # it died since it was checked; start another
+                    if self._pending >= self.max_pending:
+                        self.stats["dropped"] += 1
+                        return False
+                    self._pending += 1
+                    worker.held += 1
+                    self.stats["submitted"] += 1
+                break
+            worker.loop.call_soon_threadsafe(worker.queue.put_nowait, message)
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued message has been delivered or given up on.
+
+        Returns:
+            True if the queue emptied within the timeout
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Deliver what is queued, waiting at most timeout seconds, and stop the background thread.
+        A later notify() starts a new one.
+        """
+        with self._start_lock:
+            if not self._running():
+                return
+            worker, self._worker = self._worker, None
+            worker.loop.call_soon_threadsafe(worker.queue.put_nowait, _CLOSE)
+        worker.thread.join(timeout)
+
+    def _work(self, worker: "_Worker") -> None:
+        """The worker thread: deliver until closed, then count whatever it still holds as dropped."""
+        try:
+            worker.loop.run_until_complete(self._run(worker))
+        except Exception as e:
+            print(f"Push notifier stopped: {e!r}", file=sys.stderr)
+        finally:
+            with self._idle:
+                worker.done = True
+                self._pending -= worker.held
+                self.stats["dropped"] += worker.held
+                worker.held = 0
+                self._idle.notify_all()
+
+    async def _run(self, worker: "_Worker") -> None:
+        queue = worker.queue
+        limits = httpx.Limits(max_connections=4, max_keepalive_connections=2)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as client:
+            closing = False
+            while not closing:
+                batch, closing = await self._collect(queue)
+                attempts = 0
+                while batch:
+                    outcome = await self._send(client, digest(batch))
+                    attempts += 1
+                    if outcome == "retry" and attempts < self.max_attempts and not closing:
+                        self.stats["retries"] += 1
+                        await asyncio.sleep(min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1)))
+                        # Messages that arrived while waiting join the retried digest
+                        while len(batch) < self.max_batch and not queue.empty():
+                            message = queue.get_nowait()
+                            if message is _CLOSE:
+                                closing = True
+                            else:
+                                batch.append(message)
+                        continue
+                    self._finish(worker, batch, outcome == "sent")
+                    batch = []
+
+    async def _collect(self, queue: asyncio.Queue) -> tuple:
+        """Wait for a message, then gather any more that arrive within the coalescing window."""
+        message = await queue.get()
+        if message is _CLOSE:
+            return [], True
+        batch = [message]
+        deadline = asyncio.get_running_loop().time() + self.coalesce_seconds
+        while len(batch) < self.max_batch:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if message is _CLOSE:
+                return batch, True
+            batch.append(message)
+        return batch, False
+
+    async def _send(self, client: httpx.AsyncClient, message: str) -> str:
+        """Post one notification; returns "sent", "retry" for transient failures, or "rejected"."""
+        payload = {"token": self.token, "user": self.user, "message": message}
+        try:
+            response = await client.post(self.url, data=payload)
+        except httpx.HTTPError as e:
+            print(f"Push notification failed: {e!r}", file=sys.stderr)
+            return "retry"
+        if response.status_code == 429 or response.status_code >= 500:
+            return "retry"
+        if response.is_error:
+            print(f"Push notification rejected ({response.status_code}): {response.text[:200]}", file=sys.stderr)
+            return "rejected"
+        return "sent"
+
+    def _finish(self, worker: "_Worker", batch: List[str], sent: bool) -> None:
+        with self._idle:
+            self._pending -= len(batch)
+            worker.held -= len(batch)
+            if sent:
+                self.stats["sent"] += len(batch)
+                self.stats["digests"] += len(batch) > 1
+            else:
+                self.stats["dropped"] += len(batch)
+            self._idle.notify_all()
+
+
+# The notifier shared by everything in this process
+notifier = PushNotifier()
+
+
+def push_notification(message: str) -> bool:
+    """
+    Send a push notification without waiting for it to be delivered.
+
+    Args:
+        message: The text to send
+
+    Returns:
+        True if the message was queued
+    """
+    return notifier.notify(message)
+
+
+class StubEndpoint:
+    """
+    A local stand-in for the Pushover API that records what it receives, for testing without sending pushes.
+
+        with StubEndpoint(fail_first=2) as stub:
+            notifier = PushNotifier(url=stub.url)
+            notifier.notify("hello")
+            notifier.flush()
+            print(stub.messages)
+
+    Args:
+        port: The port to listen on (0 picks a free one)
+        fail_first: Answer this many requests with 503 first, to exercise retries
+        delay: Seconds to wait before answering each request, to exercise a slow endpoint
+        verbose: Print each message as it arrives
+    """
+
+    def __init__(self, port: int = 0, fail_first: int = 0, delay: float = 0.0, verbose: bool = False):
+        self.messages: List[str] = []
+        self.requests = 0
+        self.fail_first = fail_first
+        self.delay = delay
+        self.verbose = verbose
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                stub.requests += 1
+                time.sleep(stub.delay)
+                if stub.requests <= stub.fail_first:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                message = parse_qs(body).get("message", [""])[0]
+                stub.messages.append(message)
+                if stub.verbose:
+                    print(f"Push: {message}")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b'{"status":1}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/1/messages.json"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="push-stub", daemon=True)
+
+    def __enter__(self) -> "StubEndpoint":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local stub of the Pushover API")
+    parser.add_argument("--stub", action="store_true", help="Serve the stub endpoint until interrupted")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    if not args.stub:
+        parser.print_help()
+        return
+    with StubEndpoint(args.port, verbose=True) as stub:
+        print(f"Stub push endpoint listening; set PUSHOVER_URL={stub.url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import time
+import unittest
+
+from utils.api.notifier import PushNotifier, StubEndpoint
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestPushNotifier(unittest.TestCase):
+    def test_close_while_delivering_sends_what_was_queued(self):
+        with StubEndpoint(delay=0.5) as stub:
+            notifier = PushNotifier(url=stub.url, token="t", user="u", coalesce_seconds=0.05)
+            notifier.notify("a")
+            self.assertTrue(wait_until(lambda: stub.requests == 1))
+            notifier.notify("b")
+            notifier.close()
+            self.assertTrue(notifier.flush(5))
+            self.assertEqual(stub.messages, ["a", "b"])
+            self.assertEqual(notifier.stats["dropped"], 0)
+
+    def test_notify_after_close_starts_a_new_worker(self):
+        with StubEndpoint() as stub:
+            notifier = PushNotifier(url=stub.url, token="t", user="u", coalesce_seconds=0.05)
+            notifier.notify("a")
+            notifier.close()
+            self.assertTrue(notifier.notify("b"))
+            self.assertTrue(notifier.flush(5))
+            self.assertEqual(stub.messages, ["a", "b"])
+            notifier.close()
+
+    def test_worker_that_dies_drops_what_it_held(self):
+        async def broken(queue):
+            await queue.get()
+            raise RuntimeError("worker died")
+
+        with StubEndpoint() as stub:
+            notifier = PushNotifier(url=stub.url, token="t", user="u", coalesce_seconds=0.05)
+            notifier._collect = broken
+            notifier.notify("a")
+            self.assertTrue(notifier.flush(5))
+            self.assertEqual(notifier.stats["dropped"], 1)
+            del notifier._collect
+            notifier.notify("b")
+            self.assertTrue(notifier.flush(5))
+            self.assertEqual(stub.messages, ["b"])
+            notifier.close()
+
+
+if __name__ == "__main__":
+    unittest.main()